@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+
+"""batchtasks.py
+
+Cursor-chained task for work over every entity of a query. Each task
+handles one page of results and adds a task for the next page, so a run
+over any number of entities stays within the request deadline.
+
+"""
+
+from google.appengine.api import taskqueue
+from google.appengine.datastore.datastore_query import Cursor
+
+
+def runBatch(request, q, batch_size, url, process, keys_only=False,
+             params=None):
+    """Process one batch of a query's results and chain the next batch.
+
+    Args:
+        request: webapp2 request of the task; its cursor parameter, if
+            any, is where the batch starts
+        q: ndb query to work through
+        batch_size: results per task
+        url: task URL of the next batch
+        process: callable run on each result
+        keys_only: fetch keys instead of entities
+        params: further parameters of the chained task
+    Returns:
+        results: what process returned, per result of the batch
+    """
+    cursor = None
+    if request.get('cursor'):
+        cursor = Cursor(urlsafe=request.get('cursor'))
+    batch, next_cursor, more = q.fetch_page(
+        batch_size, start_cursor=cursor, keys_only=keys_only)
+
+    results = [process(result) for result in batch]
+
+    if more and next_cursor:
+        taskqueue.add(params=dict(params or {},
+                                  cursor=next_cursor.urlsafe()),
+                      url=url)
+    return results
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+"""copy_forms.py
+
+Micro-benchmark of the precompiled copy plans in formcopy.py against the
+reflection-based entity-to-form copies they replaced.
+
+Run from the project root with the App Engine SDK on the path:
+
+    PYTHONPATH=$GAE_SDK python benchmarks/copy_forms.py [num_sessions]
+
+"""
+
+import os
+import sys
+import timeit
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import dev_appserver
+dev_appserver.fix_sys_path()
+
+from google.appengine.ext import ndb
+
+from formcopy import compileCopyPlan
+from models import Session
+from models import SessionForm
+from models import TypeOfSession
+from utils import getTimeString
+
+APP_ID = 'copy-bench'
+REPEAT = 5
+
+
+def legacyCopySessionToForm(sess):
+    """The per-field reflection copy formerly in ConferenceApi."""
+    sf = SessionForm()
+    for field in sf.all_fields():
+        if hasattr(sess, field.name):
+            if field.name == 'date':
+                setattr(sf, field.name, str(getattr(sess, field.name)))
+            elif field.name == 'startTime' and getattr(sess, field.name) != None:
+                setattr(sf, field.name,
+                        getTimeString(getattr(sess, field.name)))
+            elif field.name == 'typeOfSession':
+                setattr(sf, field.name, getattr(
+                    TypeOfSession, getattr(sess, field.name)))
+            else:
+                setattr(sf, field.name, getattr(sess, field.name))
+        elif field.name == 'websafeKey':
+            setattr(sf, field.name, sess.key.urlsafe())
+    sf.check_initialized()
+    return sf
+
+
+def makeSessions(count):
+    """Build unsaved Session entities for one conference."""
+    c_key = ndb.Key('Profile', 'organizer', 'Conference', 1, app=APP_ID)
+    return [Session(key=ndb.Key(Session, i + 1, parent=c_key),
+                    name='Session %d' % i,
+                    highlights='Highlights of session %d' % i,
+                    speakerKeys=['speaker-a', 'speaker-b'],
+                    duration='45 minutes',
+                    typeOfSession=str(TypeOfSession.LECTURE),
+                    date=date(2026, 6, 1),
+                    startTime=9 * 3600 + (i % 16) * 1800,
+                    websafeConferenceKey=c_key.urlsafe())
+            for i in range(count)]
+
+
+def main(num_sessions):
+    sessions = makeSessions(num_sessions)
+    copySession = compileCopyPlan(Session, SessionForm,
+                                  {'startTime': getTimeString})
+
+    # both copies must produce identical forms
+    for sess in sessions:
+        assert copySession(sess) == legacyCopySessionToForm(sess)
+
+    legacy = min(timeit.repeat(
+        lambda: [legacyCopySessionToForm(s) for s in sessions],
+        repeat=REPEAT, number=1))
+    compiled = min(timeit.repeat(
+        lambda: [copySession(s) for s in sessions],
+        repeat=REPEAT, number=1))
+
+    print 'sessions copied: %d' % num_sessions
+    print 'reflection copy: %.2f ms' % (legacy * 1000)
+    print 'compiled plan:   %.2f ms' % (compiled * 1000)
+    print 'speedup:         %.1fx' % (legacy / compiled)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
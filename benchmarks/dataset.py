@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+
+"""dataset.py
+
+Synthetic dataset generator for Conference Central benchmarks.
+
+Bulk-loads Profiles, Conferences with their seat pools, Speakers, Sessions
+with the speaker aggregate, registrations, wishlists and popularity shards
+with put_multi. The same seed always produces the same dataset, so runs on
+different commits measure the same data.
+
+Used by benchmarks/run.py; it needs an active testbed (or a datastore)
+and the App Engine SDK on the path.
+
+"""
+
+import random
+from datetime import date
+from datetime import timedelta
+
+from google.appengine.ext import ndb
+
+from counters import NUM_POPULARITY_SHARDS
+from models import Conference
+from models import ConferenceSpeakers
+from models import Profile
+from models import Registration
+from models import Session
+from models import SessionPopularityShard
+from models import Speaker
+from models import TypeOfSession
+from models import WishlistEntry
+from seats import buildSeatPools
+from speakers import addSessions
+from speakers import speakersKey
+
+PUT_BATCH_SIZE = 500
+
+# Default volumes of a "realistic" dataset
+DEFAULT_SCALE = {
+    'users': 200,
+    'conferences': 50,
+    'sessionsPerConference': 20,
+    'speakers': 100,
+    'registrationsPerUser': 3,
+    'wishlistPerUser': 5,
+}
+
+CITIES = ['London', 'Chicago', 'Tokyo', 'Paris', 'San Francisco',
+          'Berlin', 'Sydney', 'Toronto']
+TOPICS = ['Medical Innovations', 'Programming Languages', 'Web Technologies',
+          'Movie Making', 'Health and Nutrition', 'Machine Learning']
+SESSION_TYPES = [str(t) for t in TypeOfSession]
+
+
+def _putAll(entities):
+    """Store entities with put_multi in batches."""
+    for i in range(0, len(entities), PUT_BATCH_SIZE):
+        ndb.put_multi(entities[i:i + PUT_BATCH_SIZE])
+
+
+def _email(i):
+    """Return the email of the i-th synthetic user."""
+    return 'user%d@example.com' % i
+
+
+def generate(seed=0, **scale):
+    """Load a synthetic dataset into the datastore.
+
+    Args:
+        seed: seed of the random generator
+        scale: overrides of DEFAULT_SCALE volumes
+    Returns:
+        dict describing the loaded data: user emails, websafe conference
+        and session keys and each user's registrations
+    """
+    scale = dict(DEFAULT_SCALE, **scale)
+    rng = random.Random(seed)
+
+    # Profiles are keyed by email, as utils.getUserId returns it
+    emails = [_email(i) for i in range(scale['users'])]
+    p_keys = [ndb.Key(Profile, email) for email in emails]
+    _putAll([Profile(key=p_key, displayName='User %d' % i, mainEmail=email,
+                     teeShirtSize='NOT_SPECIFIED')
+             for i, (p_key, email) in enumerate(zip(p_keys, emails))])
+
+    speakers = [Speaker(name='Speaker %d' % i, bio='Bio of speaker %d' % i,
+                        organization='Organization %d' % (i % 10))
+                for i in range(scale['speakers'])]
+    s_keys = ndb.put_multi(speakers)
+    wssks_speakers = [k.urlsafe() for k in s_keys]
+
+    # Conferences
+    confs = []
+    for i in range(scale['conferences']):
+        organizer = rng.randrange(scale['users'])
+        start = date(2026, 1, 1) + timedelta(days=rng.randint(0, 360))
+        max_attendees = rng.choice([10, 50, 100, 500])
+        confs.append(Conference(
+            key=ndb.Key(Conference, i + 1, parent=p_keys[organizer]),
+            name='Conference %d' % i,
+            description='Description of conference %d' % i,
+            organizerUserId=emails[organizer],
+            organizerDisplayName='User %d' % organizer,
+            topics=rng.sample(TOPICS, 2), city=rng.choice(CITIES),
+            startDate=start, month=start.month,
+            endDate=start + timedelta(days=2),
+            maxAttendees=max_attendees, seatsAvailable=max_attendees))
+
+    # Registrations, taking seats before the seat pools are built
+    registrations = dict((email, []) for email in emails)
+    reg_entities = []
+    for p_key, email in zip(p_keys, emails):
+        for conf in rng.sample(confs, min(len(confs),
+                                          scale['registrationsPerUser'])):
+            if conf.seatsAvailable > 0:
+                conf.seatsAvailable -= 1
+                registrations[email].append(conf.key.urlsafe())
+                reg_entities.append(
+                    Registration(id=conf.key.urlsafe(), parent=p_key))
+    pools = []
+    for conf in confs:
+        pools.extend(buildSeatPools(conf, conf.seatsAvailable))
+    _putAll(confs + pools + reg_entities)
+
+    # Sessions with their conference's speaker aggregate
+    sessions = []
+    tallies = []
+    for conf in confs:
+        conf_sessions = []
+        for j in range(scale['sessionsPerConference']):
+            conf_sessions.append(Session(
+                parent=conf.key, name='Session %d' % j,
+                highlights='Highlights of session %d' % j,
+                speakerKeys=rng.sample(wssks_speakers, 1),
+                duration=rng.choice(['30 minutes', '45 minutes', '1 hour']),
+                typeOfSession=rng.choice(SESSION_TYPES),
+                date=conf.startDate + timedelta(days=j % 3),
+                startTime=8 * 3600 + (j % 20) * 1800,
+                websafeConferenceKey=conf.key.urlsafe()))
+        tally = ConferenceSpeakers(key=speakersKey(conf.key))
+        addSessions(tally, conf_sessions)
+        sessions.extend(conf_sessions)
+        tallies.append(tally)
+    _putAll(sessions)
+    _putAll(tallies)
+    wssks = [s.key.urlsafe() for s in sessions]
+
+    # Wishlists and the popularity shards counting them
+    wishlist = []
+    popularity = {}
+    for p_key in p_keys:
+        for wssk in rng.sample(wssks, min(len(wssks),
+                                          scale['wishlistPerUser'])):
+            wsck = ndb.Key(urlsafe=wssk).parent().urlsafe()
+            wishlist.append(WishlistEntry(id=wssk, parent=p_key,
+                                          websafeConferenceKey=wsck))
+            shard = (wssk, wsck, rng.randrange(NUM_POPULARITY_SHARDS))
+            popularity[shard] = popularity.get(shard, 0) + 1
+    shards = [SessionPopularityShard(id='%s-%d' % (wssk, index),
+                                     websafeSessionKey=wssk,
+                                     websafeConferenceKey=wsck,
+                                     count=count)
+              for (wssk, wsck, index), count in sorted(popularity.items())]
+    _putAll(wishlist + shards)
+
+    return {
+        'scale': scale,
+        'emails': emails,
+        'conferences': [c.key.urlsafe() for c in confs],
+        'sessions': wssks,
+        'registrations': registrations,
+    }
@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+
+"""run.py
+
+Benchmark runner for the hot ConferenceApi methods.
+
+Loads a synthetic dataset (see dataset.py) into the local App Engine
+testbed stubs, then calls queryConferences, getConference,
+getConferenceSessions, getSessionsPopular and registerForConference with
+seeded random arguments. Reports p50/p95 latency, RPC counts per service
+and datastore entities read and written per call as JSON, so results of
+different commits can be compared.
+
+Run from the project root with the App Engine SDK on the path:
+
+    PYTHONPATH=$GAE_SDK python benchmarks/run.py [--seed N]
+        [--iterations N] [--cold] [--output results.json]
+
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import dev_appserver
+dev_appserver.fix_sys_path()
+
+from google.appengine.api import memcache
+from google.appengine.datastore import datastore_stub_util
+from google.appengine.ext import ndb
+from google.appengine.ext import testbed
+from protorpc import remote
+
+import dataset
+from conference import CONF_CONDITIONAL_GET
+from conference import CONF_GET_REQUEST
+from conference import ConferenceApi
+from conference import SESS_CONDITIONAL_GET
+from conference import SESS_GET_REQUEST
+from instrumentation import installRpcHook
+from instrumentation import recording
+from models import ConferenceQueryForm
+from models import ConferenceQueryForms
+from tieredcache import clearLocal
+
+AUTH_DOMAIN = 'example.com'
+PERCENTILES = (50, 95)
+QUERY_FILTERS = [
+    [],
+    [('CITY', 'EQ', dataset.CITIES[0])],
+    [('TOPIC', 'EQ', dataset.TOPICS[0])],
+    [('MONTH', 'EQ', '6')],
+    [('CITY', 'EQ', dataset.CITIES[1]), ('MAX_ATTENDEES', 'GT', '10')],
+]
+
+
+def _percentile(samples, pct):
+    """Return the pct percentile of sorted samples (nearest rank)."""
+    rank = max(0, int(round(pct / 100.0 * len(samples))) - 1)
+    return samples[rank]
+
+
+def _revision():
+    """Return the git commit being benchmarked, if known."""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _login(email):
+    """Make endpoints.get_current_user() return the user with email."""
+    os.environ['ENDPOINTS_AUTH_EMAIL'] = email
+    os.environ['ENDPOINTS_AUTH_DOMAIN'] = AUTH_DOMAIN
+
+
+class Workload(object):
+    """Seeded random calls of the benchmarked ConferenceApi methods."""
+
+    def __init__(self, data, rng):
+        self.data = data
+        self.rng = rng
+        self.api = ConferenceApi()
+        self.api.initialize_request_state(remote.HttpRequestState(headers={}))
+
+    def queryConferences(self):
+        filters = self.rng.choice(QUERY_FILTERS)
+        return self.api.queryConferences(ConferenceQueryForms(
+            filters=[ConferenceQueryForm(field=f, operator=op, value=v)
+                     for f, op, v in filters]))
+
+    def getConference(self):
+        return self.api.getConference(
+            CONF_CONDITIONAL_GET.combined_message_class(
+                websafeConferenceKey=self.rng.choice(
+                    self.data['conferences'])))
+
+    def getConferenceSessions(self):
+        return self.api.getConferenceSessions(
+            SESS_CONDITIONAL_GET.combined_message_class(
+                websafeConferenceKey=self.rng.choice(
+                    self.data['conferences'])))
+
+    def getSessionsPopular(self):
+        return self.api.getSessionsPopular(
+            SESS_GET_REQUEST.combined_message_class(
+                websafeConferenceKey=self.rng.choice(
+                    self.data['conferences'])))
+
+    def registerForConference(self):
+        # a user registering for a conference they haven't registered for
+        email = self.rng.choice(self.data['emails'])
+        registered = self.data['registrations'][email]
+        unregistered = [c for c in self.data['conferences']
+                        if c not in registered]
+        # a user registered everywhere retries one (and fails with 409)
+        wsck = self.rng.choice(unregistered or self.data['conferences'])
+        registered.append(wsck)
+        _login(email)
+        return self.api.registerForConference(
+            CONF_GET_REQUEST.combined_message_class(
+                websafeConferenceKey=wsck))
+
+
+METHODS = ('queryConferences', 'getConference', 'getConferenceSessions',
+           'getSessionsPopular', 'registerForConference')
+
+
+def _summarize(samples):
+    """Aggregate the (latency, recorder, failed) samples of one method."""
+    calls = float(len(samples))
+    latencies = sorted(s[0] for s in samples)
+    rpcs = {}
+    for _, recorder, _ in samples:
+        for service, count in recorder.rpcs.items():
+            rpcs[service] = rpcs.get(service, 0) + count
+    summary = {
+        'calls': len(samples),
+        'errors': sum(1 for s in samples if s[2]),
+        'rpcsPerCall': dict((service, count / calls)
+                            for service, count in sorted(rpcs.items())),
+        'entitiesReadPerCall': sum(s[1].read for s in samples) / calls,
+        'entitiesWrittenPerCall': sum(s[1].written for s in samples) / calls,
+    }
+    for pct in PERCENTILES:
+        summary['p%dMs' % pct] = round(_percentile(latencies, pct), 3)
+    return summary
+
+
+def run(seed, iterations, cold):
+    """Load the dataset and time every method; return the results dict."""
+    tb = testbed.Testbed()
+    tb.activate()
+    policy = datastore_stub_util.PseudoRandomHRConsistencyPolicy(
+        probability=1)
+    tb.init_datastore_v3_stub(consistency_policy=policy)
+    tb.init_memcache_stub()
+    tb.init_taskqueue_stub()
+    tb.init_user_stub()
+    tb.init_urlfetch_stub()
+    ndb.get_context().set_cache_policy(False)
+    installRpcHook()
+
+    try:
+        data = dataset.generate(seed)
+        workload = Workload(data, random.Random(seed))
+        _login(data['emails'][0])
+
+        samples = dict((name, []) for name in METHODS)
+        for _ in range(iterations):
+            for name in METHODS:
+                if cold:
+                    memcache.flush_all()
+                    clearLocal()
+                failed = False
+                start = time.time()
+                with recording() as recorder:
+                    try:
+                        getattr(workload, name)()
+                    except remote.ApplicationError:
+                        failed = True
+                latency = (time.time() - start) * 1000
+                samples[name].append((latency, recorder, failed))
+    finally:
+        tb.deactivate()
+
+    return {
+        'revision': _revision(),
+        'seed': seed,
+        'iterations': iterations,
+        'cold': cold,
+        'scale': data['scale'],
+        'methods': dict((name, _summarize(samples[name]))
+                        for name in METHODS),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the hot ConferenceApi methods.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--cold', action='store_true',
+                        help='flush memcache and instance caches before every call')
+    parser.add_argument('--output', help='write JSON here, not to stdout')
+    args = parser.parse_args()
+
+    results = json.dumps(run(args.seed, args.iterations, args.cold),
+                         indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(results + '\n')
+    else:
+        print results
+
+
+if __name__ == '__main__':
+    main()
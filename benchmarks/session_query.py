@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+"""session_query.py
+
+Benchmark of the session query planner in sessionquery.py against the
+six-branch ndb.OR query getSessionsHardQuery used before, run against the
+local App Engine testbed datastore stub.
+
+Run from the project root with the App Engine SDK on the path:
+
+    PYTHONPATH=$GAE_SDK python benchmarks/session_query.py [num_sessions]
+
+"""
+
+import os
+import sys
+import timeit
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import dev_appserver
+dev_appserver.fix_sys_path()
+
+from google.appengine.datastore import datastore_stub_util
+from google.appengine.ext import ndb
+from google.appengine.ext import testbed
+
+from models import Session
+from models import TypeOfSession
+from sessionquery import runQuery
+from utils import getSeconds
+
+REPEAT = 5
+NOT_TYPE = 'WORKSHOP'
+BEFORE_TIME = '19:00'
+
+
+def legacyHardQuery(wsck):
+    """The six-branch OR query formerly in getSessionsHardQuery."""
+    confFilter = ndb.query.FilterNode('websafeConferenceKey', '=', wsck)
+    timeFilter = ndb.query.FilterNode(
+        'startTime', '<', getSeconds(BEFORE_TIME))
+    type_filters = []
+    for session_type in TypeOfSession:
+        if str(session_type) != NOT_TYPE:
+            type_filters.append(ndb.query.FilterNode(
+                'typeOfSession', '=', str(session_type)))
+    q = Session.query(ndb.OR(
+        ndb.AND(confFilter, timeFilter, type_filters[0]),
+        ndb.AND(confFilter, timeFilter, type_filters[1]),
+        ndb.AND(confFilter, timeFilter, type_filters[2]),
+        ndb.AND(confFilter, timeFilter, type_filters[3]),
+        ndb.AND(confFilter, timeFilter, type_filters[4]),
+        ndb.AND(confFilter, timeFilter, type_filters[5])))
+    return q.fetch()
+
+
+def plannedHardQuery(wsck):
+    """The same search run through the query planner."""
+    return runQuery(wsck, [
+        {'field': 'typeOfSession', 'operator': '!=', 'value': NOT_TYPE},
+        {'field': 'startTime', 'operator': '<',
+         'value': getSeconds(BEFORE_TIME)},
+    ])
+
+
+def loadSessions(count):
+    """Store count sessions, spread over all types and times of day."""
+    c_key = ndb.Key('Profile', 'organizer', 'Conference', 1)
+    wsck = c_key.urlsafe()
+    types = [str(t) for t in TypeOfSession]
+    ndb.put_multi([Session(parent=c_key,
+                           name='Session %d' % i,
+                           typeOfSession=types[i % len(types)],
+                           date=date(2026, 6, 1 + i % 3),
+                           startTime=8 * 3600 + (i % 28) * 1800,
+                           websafeConferenceKey=wsck)
+                   for i in range(count)])
+    return wsck
+
+
+def main(num_sessions):
+    tb = testbed.Testbed()
+    tb.activate()
+    policy = datastore_stub_util.PseudoRandomHRConsistencyPolicy(
+        probability=1)
+    tb.init_datastore_v3_stub(consistency_policy=policy)
+    tb.init_memcache_stub()
+    ndb.get_context().set_cache_policy(False)
+
+    try:
+        wsck = loadSessions(num_sessions)
+
+        # both queries must return the same sessions
+        legacy_keys = set(s.key for s in legacyHardQuery(wsck))
+        planned_keys = set(s.key for s in plannedHardQuery(wsck))
+        # the OR query misses one session type, since TypeOfSession has
+        # seven values and only six branches are queried
+        assert legacy_keys <= planned_keys
+
+        legacy = min(timeit.repeat(lambda: legacyHardQuery(wsck),
+                                   repeat=REPEAT, number=1))
+        planned = min(timeit.repeat(lambda: plannedHardQuery(wsck),
+                                    repeat=REPEAT, number=1))
+    finally:
+        tb.deactivate()
+
+    print 'sessions stored:  %d' % num_sessions
+    print 'matches (OR):     %d' % len(legacy_keys)
+    print 'matches (plan):   %d' % len(planned_keys)
+    print 'six-branch OR:    %.2f ms' % (legacy * 1000)
+    print 'query planner:    %.2f ms' % (planned * 1000)
+    print 'speedup:          %.1fx' % (legacy / planned)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -13,16 +13,22 @@ created by wesc on 2014 apr 21
 __author__ = 'wesc+api@google.com (Wesley Chun)'
 
 
+import logging
+from collections import namedtuple
 from datetime import datetime
 from functools import wraps
+import hashlib
+import time
 
 import endpoints
 from protorpc import messages
 from protorpc import message_types
+from protorpc import protojson
 from protorpc import remote
 
-from google.appengine.api import memcache
+from google.appengine.api import datastore_errors
 from google.appengine.api import taskqueue
+from google.appengine.datastore.datastore_query import Cursor
 from google.appengine.ext import ndb
 
 from models import ConflictException
@@ -31,12 +37,18 @@ from models import BooleanMessage
 from models import Profile
 from models import ProfileMiniForm
 from models import ProfileForm
+from models import Registration
+from models import WishlistEntry
 from models import TeeShirtSize
 from models import Conference
 from models import ConferenceForm
 from models import ConferenceForms
 from models import ConferenceQueryForm
 from models import ConferenceQueryForms
+from models import ConferenceSummaryForm
+from models import ConferenceSummaryForms
+from models import NearlySoldOut
+from models import NearlySoldOutEntry
 from models import Speaker
 from models import SpeakerForm
 from models import SpeakerForms
@@ -44,6 +56,9 @@ from models import Session
 from models import SessionForm
 from models import SessionForms
 from models import SessionMiniHardForm
+from models import SessionQueryForms
+from models import SessionSummaryForm
+from models import SessionSummaryForms
 from models import TypeOfSession
 
 from settings import WEB_CLIENT_ID
@@ -51,17 +66,110 @@ from settings import ANDROID_CLIENT_ID
 from settings import IOS_CLIENT_ID
 from settings import ANDROID_AUDIENCE
 
+from batchtasks import runBatch
+
+from confirmations import queueConfirmationAsync
+
+from counters import changeSessionPopularity
+from counters import getPopularSessionKeys
+
+from fieldmask import applyFieldMask
+from fieldmask import parseFieldMask
+
+from formcopy import compileCopyPlan
+
+from formcache import bumpVersion
+from formcache import getForm
+from formcache import getVersion
+from formcache import putForm
+
+from idblocks import reserveIds
+from idblocks import reserveIdsAsync
+
+from instrumentation import instrumentApp
+from instrumentation import recording
+
+from querycache import bumpGeneration
+from querycache import getResult
+
+from seats import buildSeatPools
+from seats import candidatePoolKeys
+from seats import ensureSeatPools
+from seats import getSeatsAvailable
+from seats import getSeatsAvailableMultiAsync
+from seats import poolKeys
+from seats import sumSeatPools
+from seats import returnSeat
+from seats import takeSeat
+
+from sessionquery import parseFilters
+from sessionquery import runQuery
+
+from speakers import addSessionsAsync
+from speakers import featuredSpeaker
+from speakers import getSpeakers
+from speakers import storeSpeakers
+
+from tieredcache import TieredCache
+
 from utils import getUserId
+from utils import parseKey
 from utils import getSeconds
 from utils import getTimeString
 
 EMAIL_SCOPE = endpoints.EMAIL_SCOPE
 API_EXPLORER_CLIENT_ID = endpoints.API_EXPLORER_CLIENT_ID
-MEMCACHE_ANNOUNCEMENTS_KEY = "RECENT_ANNOUNCEMENTS"
+# holds (NearlySoldOut version, announcement)
+MEMCACHE_ANNOUNCEMENTS_KEY = "RECENT_ANNOUNCEMENTS_V2"
+NEARLY_SOLD_OUT_ID = "announcement"
+NEARLY_SOLD_OUT_SEATS = 5
 ANNOUNCEMENT_TPL = ('Last chance to attend! The following conferences '
                     'are nearly sold out: %s')
-MEMCACHE_FEATURED_SPEAKER_KEY = "FEATURED_SPEAKER_"
+# holds (ConferenceSpeakers version, featured speaker)
+MEMCACHE_FEATURED_SPEAKER_KEY = "FEATURED_SPEAKER_V2_"
+MEMCACHE_CONFERENCE_KEY = "CONFERENCE_"
+MEMCACHE_PROFILE_KEY = "PROFILE_"
+MEMCACHE_SESSIONS_KEY = "SESSIONS_"
+MEMCACHE_SPEAKERS_KEY = "SPEAKERS"
+ORGANIZER_NAME_BATCH_SIZE = 100
+SPEAKERS_BACKFILL_BATCH_SIZE = 100
+NEARLY_SOLD_OUT_BATCH_SIZE = 100
+PROFILE_MIGRATION_BATCH_SIZE = 100
 FEATURED_SPEAKER_TPL = ('Featured speaker: %s\nSessions: %s')
+# featured speaker tasks run at the end of a window of this many seconds
+FEATURED_SPEAKER_WINDOW = 10
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+POPULAR_SESSIONS_LIMIT = 3
+# sessions stored by one createSessions call, all in a single transaction
+MAX_SESSIONS_PER_BATCH = 100
+
+# Hot values served from instance memory in front of memcache. Instances
+# see changes made elsewhere within the local TTL (seconds).
+ANNOUNCEMENT_CACHE = TieredCache(MEMCACHE_ANNOUNCEMENTS_KEY, local_ttl=10,
+                                 max_entries=1)
+FEATURED_SPEAKER_CACHE = TieredCache(MEMCACHE_FEATURED_SPEAKER_KEY,
+                                     local_ttl=30, max_entries=200)
+SPEAKERS_CACHE = TieredCache(MEMCACHE_SPEAKERS_KEY, local_ttl=60,
+                             memcache_ttl=3600, max_entries=1)
+
+# Copy plans from entities to their forms, compiled once at import
+copyProfile = compileCopyPlan(Profile, ProfileForm)
+copyConference = compileCopyPlan(Conference, ConferenceForm)
+copySpeaker = compileCopyPlan(Speaker, SpeakerForm)
+copySession = compileCopyPlan(Session, SessionForm,
+                              {'startTime': getTimeString})
+copySessionSummary = compileCopyPlan(Session, SessionSummaryForm,
+                                     {'startTime': getTimeString})
+
+# Session properties read by the session summary projection query
+SESSION_SUMMARY_PROJECTION = (Session.startTime, Session.date,
+                              Session.name, Session.typeOfSession)
+
+# Result of a conference list helper: the ConferenceForms to return and
+# the API calls made to build them, per service, as counted by the
+# instrumentation hook.
+ConferenceList = namedtuple('ConferenceList', ['forms', 'rpcs'])
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
@@ -93,6 +201,12 @@ CONF_GET_REQUEST = endpoints.ResourceContainer(
     websafeConferenceKey=messages.StringField(1),
 )
 
+CONF_CONDITIONAL_GET = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    websafeConferenceKey=messages.StringField(1),
+    ifNoneMatch=messages.StringField(2),
+)
+
 CONF_POST_REQUEST = endpoints.ResourceContainer(
     ConferenceForm,
     websafeConferenceKey=messages.StringField(1),
@@ -101,11 +215,34 @@ CONF_POST_REQUEST = endpoints.ResourceContainer(
 CONF_BY_ORGANIZER_GET = endpoints.ResourceContainer(
     message_types.VoidMessage,
     organizer=messages.StringField(1),
+    pageSize=messages.IntegerField(2),
+    pageToken=messages.StringField(3),
+    fields=messages.StringField(4),
+)
+
+LIST_GET_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    fields=messages.StringField(1),
+)
+
+CONF_PAGE_REQUEST = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    pageSize=messages.IntegerField(1),
+    pageToken=messages.StringField(2),
+    fields=messages.StringField(3),
 )
 
 SESS_GET_REQUEST = endpoints.ResourceContainer(
     message_types.VoidMessage,
     websafeConferenceKey=messages.StringField(1),
+    fields=messages.StringField(2),
+)
+
+SESS_CONDITIONAL_GET = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    websafeConferenceKey=messages.StringField(1),
+    ifNoneMatch=messages.StringField(2),
+    fields=messages.StringField(3),
 )
 
 SESS_POST_REQUEST = endpoints.ResourceContainer(
@@ -113,15 +250,22 @@ SESS_POST_REQUEST = endpoints.ResourceContainer(
     websafeConferenceKey=messages.StringField(1),
 )
 
+SESS_BATCH_POST_REQUEST = endpoints.ResourceContainer(
+    SessionForms,
+    websafeConferenceKey=messages.StringField(1),
+)
+
 SESS_TYPE_GET = endpoints.ResourceContainer(
     message_types.VoidMessage,
     websafeConferenceKey=messages.StringField(1),
     typeOfSession=messages.StringField(2),
+    fields=messages.StringField(3),
 )
 
 SESS_SPEAKER_GET = endpoints.ResourceContainer(
     message_types.VoidMessage,
     websafeSpeakerKey=messages.StringField(1),
+    fields=messages.StringField(2),
 )
 
 SESS_WISHLIST_POST = endpoints.ResourceContainer(
@@ -132,11 +276,24 @@ SESS_WISHLIST_POST = endpoints.ResourceContainer(
 SESS_WISHLIST_GET = endpoints.ResourceContainer(
     message_types.VoidMessage,
     websafeConferenceKey=messages.StringField(1),
+    fields=messages.StringField(2),
 )
 
 SESS_HARD_QUERY_POST = endpoints.ResourceContainer(
     SessionMiniHardForm,
     websafeConferenceKey=messages.StringField(1),
+    fields=messages.StringField(2),
+)
+
+SESS_SEARCH_POST = endpoints.ResourceContainer(
+    SessionQueryForms,
+    websafeConferenceKey=messages.StringField(1),
+    fields=messages.StringField(2),
+)
+
+ANNOUNCEMENT_GET = endpoints.ResourceContainer(
+    message_types.VoidMessage,
+    ifNoneMatch=messages.StringField(1),
 )
 
 FEATURED_SPEAKER_GET = endpoints.ResourceContainer(
@@ -159,18 +316,15 @@ class ConferenceApi(remote.Service):
 
     def _copyProfileToForm(self, prof):
         """Copy relevant fields from Profile to ProfileForm."""
-        # copy relevant fields from Profile to ProfileForm
-        pf = ProfileForm()
-        for field in pf.all_fields():
-            if hasattr(prof, field.name):
-                # convert t-shirt string to Enum; just copy others
-                if field.name == 'teeShirtSize':
-                    setattr(pf, field.name, getattr(
-                        TeeShirtSize, getattr(prof, field.name)))
-                else:
-                    setattr(pf, field.name, getattr(prof, field.name))
-        pf.check_initialized()
-        return pf
+        # registrations and wishlist are child entities of the Profile;
+        # list their ids with two concurrent keys-only ancestor queries
+        regs = Registration.query(ancestor=prof.key).fetch_async(
+            keys_only=True)
+        wishes = WishlistEntry.query(ancestor=prof.key).fetch_async(
+            keys_only=True)
+        return copyProfile(prof,
+            conferenceKeysToAttend=[k.id() for k in regs.get_result()],
+            sessionWishlistKeys=[k.id() for k in wishes.get_result()])
 
     def _getProfileFromUser(self):
         """Return user Profile from datastore, creating new one if
@@ -179,22 +333,114 @@ class ConferenceApi(remote.Service):
         if not user:
             raise endpoints.UnauthorizedException('Authorization required.')
 
-        # get Profile from datastore
+        # get Profile from datastore; repeated reads are served from ndb's
+        # request and memcache caches
         user_id = getUserId(user)
         p_key = ndb.Key(Profile, user_id)
         profile = p_key.get()
-        # create new Profile if not there
+        # create new Profile if not there; get_or_insert makes concurrent
+        # first requests of a user agree on a single Profile
         if not profile:
-            profile = Profile(
-                key=p_key,
+            profile = Profile.get_or_insert(
+                user_id,
                 displayName=user.nickname(),
                 mainEmail=user.email(),
                 teeShirtSize=str(TeeShirtSize.NOT_SPECIFIED),
             )
-            profile.put()
+        # move lists stored on the Profile before the Registration and
+        # WishlistEntry kinds existed
+        elif profile.conferenceKeysToAttend or profile.sessionWishlistKeys:
+            profile = self._migrateProfileLists(p_key)
 
         return profile
 
+    @staticmethod
+    def _migrateProfileLists(p_key):
+        """Move a Profile's legacy registration and wishlist lists into
+        Registration and WishlistEntry entities.
+
+        The legacy lists were never validated; malformed keys and keys of
+        sessions that don't exist are logged and dropped. Migrated wishlist
+        entries are counted towards session popularity by a task added if
+        the migration commits.
+        """
+        # Sessions live in other entity groups, so look them up before the
+        # transaction; they are never deleted, so the answer can't go stale.
+        s_keys = filter(None, [parseKey(wssk, Session)
+                               for wssk in p_key.get().sessionWishlistKeys])
+        sessions = ndb.get_multi(s_keys)
+        existing = set(k.urlsafe() for k, s in zip(s_keys, sessions) if s)
+        return ConferenceApi._migrateProfileListsTxn(p_key, existing)
+
+    @staticmethod
+    @ndb.transactional
+    def _migrateProfileListsTxn(p_key, existing):
+        """Migrate a Profile's lists, keeping the wishlisted sessions whose
+        websafe keys are in existing."""
+        prof = p_key.get()
+        if not (prof.conferenceKeysToAttend or prof.sessionWishlistKeys):
+            return prof
+        entities = []
+        for wsck in prof.conferenceKeysToAttend:
+            if parseKey(wsck, Conference):
+                entities.append(Registration(id=wsck, parent=p_key))
+            else:
+                logging.warning('Dropping invalid registration %r of %s',
+                                wsck, p_key.id())
+        wishes = []
+        for wssk in prof.sessionWishlistKeys:
+            if wssk in existing:
+                wishes.append(ConferenceApi._newWishlistEntry(
+                    p_key, wssk, counted=False))
+            else:
+                logging.warning('Dropping wishlist entry %r of %s: no such '
+                                'session', wssk, p_key.id())
+        # entries added since the lists were last written are counted
+        # already; keep them as they are
+        stored = ndb.get_multi([w.key for w in wishes])
+        wishes = [w for w, old in zip(wishes, stored) if not old]
+        if wishes:
+            taskqueue.add(params={'userId': p_key.id()},
+                          url='/tasks/count_wishlist', transactional=True)
+        prof.conferenceKeysToAttend = []
+        prof.sessionWishlistKeys = []
+        ndb.put_multi(entities + wishes + [prof])
+        return prof
+
+    @staticmethod
+    def _countMigratedWishlist(request):
+        """Count a Profile's migrated wishlist entries towards session
+        popularity; called from a task added by the migration."""
+        p_key = ndb.Key(Profile, request.get('userId'))
+        for entry in WishlistEntry.query(ancestor=p_key):
+            if not entry.counted:
+                ConferenceApi._countWishlistEntry(entry.key)
+
+    @staticmethod
+    @ndb.transactional(xg=True)
+    def _countWishlistEntry(entry_key):
+        """Count one migrated wishlist entry, at most once."""
+        entry = entry_key.get()
+        if not entry or entry.counted:
+            return
+        s_key = ndb.Key(urlsafe=entry_key.id())
+        # entries migrated before missing sessions were dropped may point
+        # at no session
+        if s_key.get():
+            changeSessionPopularity(s_key)
+        entry.counted = True
+        entry.put()
+
+    @staticmethod
+    def _migrateProfiles(request):
+        """Migrate legacy registration and wishlist lists of all Profiles,
+        one batch per task."""
+        def migrate(prof):
+            if prof.conferenceKeysToAttend or prof.sessionWishlistKeys:
+                ConferenceApi._migrateProfileLists(prof.key)
+        runBatch(request, Profile.query(), PROFILE_MIGRATION_BATCH_SIZE,
+                 '/tasks/migrate_profiles', migrate)
+
     def _doProfile(self, save_request=None):
         """Get user Profile and return to user, possibly updating it first."""
         # get user Profile
@@ -202,21 +448,46 @@ class ConferenceApi(remote.Service):
 
         # if saveProfile(), process user-modifyable fields
         if save_request:
+            old_name = prof.displayName
+            changed = False
             for field in ('displayName', 'teeShirtSize'):
                 if hasattr(save_request, field):
                     val = getattr(save_request, field)
                     if val:
                         setattr(prof, field, str(val))
-                        prof.put()
+                        changed = True
+            if changed:
+                prof.put()
+                # refresh the cached ProfileForm now the save has committed
+                pf = self._copyProfileToForm(prof)
+                putForm(MEMCACHE_PROFILE_KEY + prof.key.id(),
+                        self._profileChanged(prof.key), pf)
+            # copy a new display name onto the user's conferences
+            if prof.displayName != old_name:
+                taskqueue.add(params={'userId': prof.key.id()},
+                    url='/tasks/set_organizer_names')
+            if changed:
+                return pf
 
         # return ProfileForm
         return self._copyProfileToForm(prof)
 
+    @staticmethod
+    def _profileChanged(p_key):
+        """Outdate the cached ProfileForm of a Profile after a committed
+        change to it, its registrations or its wishlist."""
+        return bumpVersion(MEMCACHE_PROFILE_KEY + p_key.id())
+
     @endpoints.method(message_types.VoidMessage, ProfileForm,
             path='profile', http_method='GET', name='getProfile')
     def getProfile(self, request):
         """Return user profile."""
-        return self._doProfile()
+        user = endpoints.get_current_user()
+        if not user:
+            raise endpoints.UnauthorizedException('Authorization required.')
+        # serve the ProfileForm from memcache, building it on a miss
+        return getForm(MEMCACHE_PROFILE_KEY + getUserId(user), ProfileForm,
+                       self._doProfile)
 
     @endpoints.method(ProfileMiniForm, ProfileForm,
             path='profile', http_method='POST', name='saveProfile')
@@ -226,22 +497,15 @@ class ConferenceApi(remote.Service):
 
 # - - - Conference objects - - - - - - - - - - - - - - - - -
 
-    def _copyConferenceToForm(self, conf, displayName):
-        """Copy relevant fields from Conference to ConferenceForm."""
-        cf = ConferenceForm()
-        for field in cf.all_fields():
-            if hasattr(conf, field.name):
-                # convert Date to date string; just copy others
-                if field.name.endswith('Date'):
-                    setattr(cf, field.name, str(getattr(conf, field.name)))
-                else:
-                    setattr(cf, field.name, getattr(conf, field.name))
-            elif field.name == "websafeKey":
-                setattr(cf, field.name, conf.key.urlsafe())
-        if displayName:
-            setattr(cf, 'organizerDisplayName', displayName)
-        cf.check_initialized()
-        return cf
+    def _copyConferenceToForm(self, conf, seatsAvailable=None):
+        """Copy relevant fields from Conference to ConferenceForm.
+
+        seatsAvailable may be passed in when it was already read for a batch
+        of conferences; otherwise it is summed from the seat pools.
+        """
+        if seatsAvailable is None:
+            seatsAvailable = getSeatsAvailable(conf)
+        return copyConference(conf, seatsAvailable=seatsAvailable)
 
     def _createConferenceObject(self, request):
         """Create or update Conference object, returning
@@ -260,7 +524,8 @@ class ConferenceApi(remote.Service):
         data = {field.name: getattr(request, field.name)
             for field in request.all_fields()}
         del data['websafeKey']
-        del data['organizerDisplayName']
+        del data['etag']
+        del data['notModified']
 
         # add default values for those missing
         # (both data model & outbound Message)
@@ -287,20 +552,36 @@ class ConferenceApi(remote.Service):
         # generate Profile Key based on user ID and Conference
         # ID based on Profile key get Conference key from ID
         p_key = ndb.Key(Profile, user_id)
-        c_id = Conference.allocate_ids(size=1, parent=p_key)[0]
+        c_id = reserveIds(Conference, p_key)
         c_key = ndb.Key(Conference, c_id, parent=p_key)
         data['key'] = c_key
         data['organizerUserId'] = request.organizerUserId = user_id
-
-        # create Conference, send email to organizer confirming
-        # creation of Conference & return (modified) ConferenceForm
-        Conference(**data).put()
-        taskqueue.add(params={'email': user.email(),
-            'conferenceInfo': repr(request)},
-            url='/tasks/send_confirmation_email')
+        # store organizer's name with the conference so reads don't need
+        # the Profile
+        data['organizerDisplayName'] = request.organizerDisplayName = (
+            self._getProfileFromUser().displayName)
+
+        # create Conference and its seat pools, queue email to organizer
+        # confirming creation of Conference & return (modified) ConferenceForm
+        conf = Conference(**data)
+        pools = buildSeatPools(conf, conf.seatsAvailable)
+        self._storeConferenceAsync(
+            conf, pools, user.email(), repr(request)).get_result()
+        bumpGeneration()
+        self._syncNearlySoldOut(conf)
         return request
 
-    @ndb.transactional()
+    @staticmethod
+    @ndb.transactional_tasklet(xg=True)
+    def _storeConferenceAsync(conf, pools, email, conference_info):
+        """Store a new Conference with its seat pools; the organizer's
+        confirmation email is queued only if they commit."""
+        put_futures = ndb.put_multi_async([conf] + pools)
+        yield queueConfirmationAsync(email, conference_info,
+                                     transactional=True)
+        yield put_futures
+
+    @ndb.transactional(xg=True)
     def _updateConferenceObject(self, request):
         user = endpoints.get_current_user()
         if not user:
@@ -329,6 +610,10 @@ class ConferenceApi(remote.Service):
         # copy relevant fields from ConferenceForm to Conference object
         for field in request.all_fields():
             data = getattr(request, field.name)
+            # organizer's name is kept in sync with the Profile; the ETag
+            # fields only exist on responses
+            if field.name in ('organizerDisplayName', 'etag', 'notModified'):
+                continue
             # only copy fields where we get data
             if data not in (None, []):
                 # special handling for dates (convert string to Date)
@@ -338,9 +623,12 @@ class ConferenceApi(remote.Service):
                         conf.month = data.month
                 # write to Conference object
                 setattr(conf, field.name, data)
-        conf.put()
-        prof = ndb.Key(Profile, user_id).get()
-        return self._copyConferenceToForm(conf, getattr(prof, 'displayName'))
+        # redistribute seats across the pools if they were set explicitly
+        pools = []
+        if request.seatsAvailable is not None:
+            pools = buildSeatPools(conf, request.seatsAvailable)
+        ndb.put_multi([conf] + pools)
+        return self._copyConferenceToForm(conf, request.seatsAvailable)
 
     @endpoints.method(ConferenceForm, ConferenceForm, path='conference',
             http_method='POST', name='createConference')
@@ -353,24 +641,132 @@ class ConferenceApi(remote.Service):
             http_method='PUT', name='updateConference')
     def updateConference(self, request):
         """Update conference w/provided fields & return w/updated info."""
-        return self._updateConferenceObject(request)
+        cf = self._updateConferenceObject(request)
+        # refresh the cached ConferenceForm now the update has committed
+        name = MEMCACHE_CONFERENCE_KEY + request.websafeConferenceKey
+        putForm(name, bumpVersion(name), cf)
+        bumpGeneration()
+        # seats or name may have changed the announcement
+        self._syncNearlySoldOut(
+            ndb.Key(urlsafe=request.websafeConferenceKey).get())
+        return cf
+
+    @ndb.tasklet
+    def _getConferenceFormAsync(self, wsck):
+        """Build the ConferenceForm for a websafe Conference key."""
+        # get Conference object from request
+        conf = yield ndb.Key(urlsafe=wsck).get_async()
+        # bail if not found
+        if not conf:
+            raise endpoints.NotFoundException(
+                'No conference found with key: %s' % wsck)
+        # read only the seat pools the conference has (conf.seatPools)
+        seats_left = yield getSeatsAvailableMultiAsync([conf])
+        # return ConferenceForm
+        raise ndb.Return(self._copyConferenceToForm(conf, seats_left[0]))
 
-    @endpoints.method(CONF_GET_REQUEST, ConferenceForm,
+    @endpoints.method(CONF_CONDITIONAL_GET, ConferenceForm,
             path='conference/{websafeConferenceKey}',
             http_method='GET', name='getConference')
     def getConference(self, request):
         """Return requested conference (by websafeConferenceKey)."""
         wsck = request.websafeConferenceKey
-        # get Conference object from request; bail if not found
-        conf = ndb.Key(urlsafe=wsck).get()
-        if not conf:
-            raise endpoints.NotFoundException(
-                'No conference found with key: %s' % wsck)
-        prof = conf.key.parent().get()
-        # return ConferenceForm
-        return self._copyConferenceToForm(conf, getattr(prof, 'displayName'))
+        name = MEMCACHE_CONFERENCE_KEY + wsck
+        etag = self._versionETag(name)
+        if etag and etag == self._ifNoneMatch(request):
+            return ConferenceForm(etag=etag, notModified=True)
+        # serve the ConferenceForm from memcache, building it on a miss
+        cf = getForm(name, ConferenceForm,
+                     lambda: self._getConferenceFormAsync(wsck).get_result())
+        cf.etag = etag
+        return cf
 
-    @endpoints.method(message_types.VoidMessage, ConferenceForms,
+    def _ifNoneMatch(self, request):
+        """Return the ETag a client already has, sent either as the
+        ifNoneMatch parameter or in an If-None-Match header."""
+        etag = request.ifNoneMatch
+        if not etag and self.request_state:
+            etag = self.request_state.headers.get('If-None-Match')
+        if not etag:
+            return None
+        if etag.startswith('W/'):
+            etag = etag[2:]
+        return etag.strip('"')
+
+    def _versionETag(self, name):
+        """Return the ETag for the current version of name, or None if
+        memcache can't tell.
+
+        Read it before building the response: versions are bumped after
+        writes commit, so the ETag never claims newer data than is sent.
+        """
+        version = getVersion(name)
+        if version is None:
+            return None
+        return str(version)
+
+    def _fetchPage(self, q, request):
+        """Fetch one page of query results, returning (entities, token).
+
+        Page size and start position come from the request's pageSize and
+        pageToken fields. The token is the websafe ndb cursor to pass back
+        for the next page, or None once the results are exhausted.
+        """
+        page_size = request.pageSize or DEFAULT_PAGE_SIZE
+        if page_size < 0:
+            raise endpoints.BadRequestException(
+                "'pageSize' must be a positive number.")
+        page_size = min(page_size, MAX_PAGE_SIZE)
+
+        cursor = None
+        if request.pageToken:
+            try:
+                cursor = Cursor(urlsafe=request.pageToken)
+            except datastore_errors.BadValueError:
+                raise endpoints.BadRequestException('Invalid pageToken.')
+
+        # one batch covers the whole page, so the page costs a single RPC
+        results, next_cursor, more = q.fetch_page(
+            page_size, start_cursor=cursor, batch_size=page_size + 1)
+        if more and next_cursor:
+            return results, next_cursor.urlsafe()
+        return results, None
+
+    def _listConferences(self, q, request):
+        """Run a conference query once for the requested page and return a
+        ConferenceList of its forms."""
+        with recording() as recorder:
+            confs, next_token = self._fetchPage(q, request)
+            forms = self._conferenceForms(confs, next_token)
+        return ConferenceList(forms, recorder.rpcs)
+
+    def _listConferencesByKey(self, c_keys):
+        """Fetch conferences by key and return a ConferenceList of their
+        forms."""
+        # fetch every conference once, but keep the requested order; then
+        # read only the seat pools they have in a second batch
+        with recording() as recorder:
+            unique_keys = list(set(c_keys))
+            entities = dict((e.key, e) for e in ndb.get_multi(unique_keys)
+                            if e)
+            confs = [entities[k] for k in c_keys if k in entities]
+            forms = self._conferenceForms(confs, None)
+        return ConferenceList(forms, recorder.rpcs)
+
+    def _conferenceForms(self, confs, next_token):
+        """Build ConferenceForms from materialized conferences.
+
+        Related entities (the seat pools) are deduplicated and read with one
+        get_multi_async.
+        """
+        seats_future = getSeatsAvailableMultiAsync(confs)
+        return ConferenceForms(
+            items=[self._copyConferenceToForm(conf, seats_left)
+                for conf, seats_left in zip(confs, seats_future.get_result())],
+            nextPageToken=next_token
+        )
+
+    @endpoints.method(CONF_PAGE_REQUEST, ConferenceForms,
             path='getConferencesCreated',
             http_method='POST', name='getConferencesCreated')
     def getConferencesCreated(self, request):
@@ -381,20 +777,20 @@ class ConferenceApi(remote.Service):
 
         user_id = getUserId(user)
 
+        mask = parseFieldMask(request.fields, ConferenceForm)
         # create ancestor query for all key matches for this user
-        confs = Conference.query(ancestor=ndb.Key(Profile, user_id))
-        prof = ndb.Key(Profile, user_id).get()
+        q = Conference.query(ancestor=ndb.Key(Profile, user_id))
         # return set of ConferenceForm objects per Conference
-        return ConferenceForms(
-            items=[self._copyConferenceToForm(
-                conf, getattr(prof, 'displayName')) for conf in confs]
-        )
+        forms = self._listConferences(q, request).forms
+        applyFieldMask(forms.items, mask)
+        return forms
 
     @endpoints.method(CONF_BY_ORGANIZER_GET, ConferenceForms,
             path='getConferencesByOrganizer/{organizer}',
             name='getConferencesByOrganizer')
     def getConferencesByOrganizer(self, request):
         """Return conferences created by organizer."""
+        mask = parseFieldMask(request.fields, ConferenceForm)
         q = Profile.query()
         q = q.filter(Profile.displayName == request.organizer)
         prof = q.get()
@@ -404,18 +800,16 @@ class ConferenceApi(remote.Service):
 
         q = Conference.query()
         q = q.filter(Conference.organizerUserId == prof.key.id())
-        confs = q.fetch()
 
         # return set of ConferenceForm objects per Conference
-        return ConferenceForms(
-            items=[self._copyConferenceToForm(
-                conf, getattr(prof, 'displayName')) for conf in confs]
-        )
+        forms = self._listConferences(q, request).forms
+        applyFieldMask(forms.items, mask)
+        return forms
 
-    def _getQuery(self, request):
-        """Return formatted query from the submitted filters."""
+    def _getQuery(self, inequality_filter, filters):
+        """Return formatted query from the filters returned by
+        _formatFilters."""
         q = Conference.query()
-        inequality_filter, filters = self._formatFilters(request.filters)
 
         # If exists, sort on inequality filter first
         if not inequality_filter:
@@ -423,6 +817,9 @@ class ConferenceApi(remote.Service):
         else:
             q = q.order(ndb.GenericProperty(inequality_filter))
             q = q.order(Conference.name)
+        # Tie-break on key so cursors are stable; this is also required for
+        # paging through the OR queries that "!=" filters expand into.
+        q = q.order(Conference.key)
 
         for filtr in filters:
             if filtr["field"] in ["month", "maxAttendees"]:
@@ -468,32 +865,85 @@ class ConferenceApi(remote.Service):
             name='queryConferences')
     def queryConferences(self, request):
         """Query for conferences."""
-        conferences = self._getQuery(request)
-
-        # need to fetch organiser displayName from profiles
-        # get all keys and use get_multi for speed
-        organisers = [(ndb.Key(Profile, conf.organizerUserId))
-            for conf in conferences]
-        profiles = ndb.get_multi(organisers)
+        mask = parseFieldMask(request.fields, ConferenceForm)
+        forms = self._queryConferenceForms(request)
+        applyFieldMask(forms.items, mask)
+        return forms
 
-        # put display names in a dict for easier fetching
-        names = {}
-        for profile in profiles:
-            names[profile.key.id()] = profile.displayName
+    @endpoints.method(ConferenceQueryForms, ConferenceSummaryForms,
+            path='queryConferences/summary',
+            http_method='POST',
+            name='queryConferenceSummaries')
+    def queryConferenceSummaries(self, request):
+        """Query for conferences, returning only the list view fields."""
+        mask = parseFieldMask(request.fields, ConferenceSummaryForm)
+        # Seats live in the seat pools, whose count isn't indexed, so a
+        # projection can't serve them; the summaries come from the cached
+        # ConferenceForms instead. They make responses smaller, not reads.
+        forms = self._queryConferenceForms(request)
+        return ConferenceSummaryForms(
+            items=applyFieldMask([ConferenceSummaryForm(
+                name=cf.name, city=cf.city, startDate=cf.startDate,
+                endDate=cf.endDate, seatsAvailable=cf.seatsAvailable,
+                websafeKey=cf.websafeKey) for cf in forms.items], mask),
+            nextPageToken=forms.nextPageToken
+        )
 
+    def _queryConferenceForms(self, request):
+        """Return the ConferenceForms matching a ConferenceQueryForms."""
+        inequality_filter, filters = self._formatFilters(request.filters)
+        # Serve repeated filter combinations from the result cache. The key
+        # is taken before _getQuery converts filter values in place.
+        page = (request.pageSize or DEFAULT_PAGE_SIZE, request.pageToken)
         # return individual ConferenceForm object per Conference
-        return ConferenceForms(
-                items=[self._copyConferenceToForm(
-                    conf, names[conf.organizerUserId]) for conf in conferences]
-        )
+        return getResult(filters, page, ConferenceForms,
+            lambda: self._listConferences(
+                self._getQuery(inequality_filter, filters),
+                request).forms)
+
+    @staticmethod
+    @ndb.transactional
+    def _setOrganizerName(c_key, name):
+        """Store organizer's display name on a Conference; return True if
+        it changed."""
+        conf = c_key.get()
+        if not conf or conf.organizerDisplayName == name:
+            return False
+        conf.organizerDisplayName = name
+        conf.put()
+        return True
+
+    @staticmethod
+    def _setOrganizerNames(request):
+        """Copy organizers' display names onto their Conferences, one batch
+        per task; called when a user changes their name (userId set), and
+        to backfill existing data."""
+        user_id = request.get('userId')
+        if user_id:
+            q = Conference.query(ancestor=ndb.Key(Profile, user_id))
+        else:
+            q = Conference.query()
+
+        def copyName(c_key):
+            # Conferences are children of their organizer's Profile; the
+            # context cache reads each organizer once per batch.
+            prof = c_key.parent().get()
+            if prof and ConferenceApi._setOrganizerName(
+                    c_key, prof.displayName):
+                bumpVersion(MEMCACHE_CONFERENCE_KEY + c_key.urlsafe())
+                return True
+            return False
+        renamed = runBatch(request, q, ORGANIZER_NAME_BATCH_SIZE,
+                           '/tasks/set_organizer_names', copyName,
+                           keys_only=True, params={'userId': user_id or ''})
+        if any(renamed):
+            bumpGeneration()
 
 # - - - Registration - - - - - - - - - - - - - - - - - - - -
 
-    @ndb.transactional(xg=True)
     def _conferenceRegistration(self, request, reg=True):
         """Register or unregister user for selected conference."""
-        retval = None
-        prof = self._getProfileFromUser()
+        p_key = self._getProfileFromUser().key
 
         # check if conf exists given websafeConfKey
         # get conference; check that it exists
@@ -502,66 +952,92 @@ class ConferenceApi(remote.Service):
         if not conf:
             raise endpoints.NotFoundException(
                 'No conference found with key: %s' % wsck)
-
-        # register
-        if reg:
-            # check if user already registered otherwise add
-            if wsck in prof.conferenceKeysToAttend:
-                raise ConflictException(
-                    "You have already registered for this conference")
-
-            # check if seats avail
-            if conf.seatsAvailable <= 0:
-                raise ConflictException(
-                    "There are no seats available.")
-
-            # register user, take away one seat
-            prof.conferenceKeysToAttend.append(wsck)
-            conf.seatsAvailable -= 1
-            retval = True
+        conf = ensureSeatPools(conf)
 
         # unregister
-        else:
-            # check if user already registered
-            if wsck in prof.conferenceKeysToAttend:
+        if not reg:
+            retval = self._unregisterTxn(p_key, conf)
+            if retval:
+                bumpVersion(MEMCACHE_CONFERENCE_KEY + wsck)
+                self._profileChanged(p_key)
+                bumpGeneration()
+            return BooleanMessage(data=retval)
+
+        # register: try the pools that had seats left, one at a time, so
+        # each attempt only contends with registrations on the same pool
+        for pool_key in candidatePoolKeys(conf):
+            if self._registerTxn(p_key, wsck, pool_key):
+                # seat count changed; outdate the cached ConferenceForm, and
+                # the ProfileForm listing the user's conferences
+                bumpVersion(MEMCACHE_CONFERENCE_KEY + wsck)
+                self._profileChanged(p_key)
+                bumpGeneration()
+                return BooleanMessage(data=True)
+
+        # check if user already registered before reporting a full house
+        if ndb.Key(Registration, wsck, parent=p_key).get():
+            raise ConflictException(
+                "You have already registered for this conference")
+        raise ConflictException(
+            "There are no seats available.")
 
-                # unregister user, add back one seat
-                prof.conferenceKeysToAttend.remove(wsck)
-                conf.seatsAvailable += 1
-                retval = True
-            else:
-                retval = False
+    @ndb.transactional(xg=True)
+    def _registerTxn(self, p_key, wsck, pool_key):
+        """Register user taking a seat from the given pool; return False if
+        the pool ran out of seats."""
+        # check if user already registered otherwise add
+        reg_key = ndb.Key(Registration, wsck, parent=p_key)
+        if reg_key.get():
+            raise ConflictException(
+                "You have already registered for this conference")
+
+        # check if seats avail in this pool
+        pool = takeSeat(pool_key)
+        if not pool:
+            return False
+
+        # register user & write things back to the datastore; the index
+        # sync is queued with them, so it can't be lost if this instance
+        # dies after the commit
+        ndb.put_multi([Registration(key=reg_key), pool])
+        self._queueNearlySoldOutSync(wsck)
+        return True
 
-        # write things back to the datastore & return
-        prof.put()
-        conf.put()
-        return BooleanMessage(data=retval)
+    @ndb.transactional(xg=True)
+    def _unregisterTxn(self, p_key, conf):
+        """Unregister user, giving their seat back to one of the pools."""
+        # check if user already registered
+        reg_key = ndb.Key(Registration, conf.key.urlsafe(), parent=p_key)
+        if not reg_key.get():
+            return False
+
+        # unregister user, add back one seat & write things back
+        reg_key.delete()
+        returnSeat(conf).put()
+        self._queueNearlySoldOutSync(conf.key.urlsafe())
+        return True
 
-    @endpoints.method(message_types.VoidMessage, ConferenceForms,
+    @staticmethod
+    def _queueNearlySoldOutSync(wsck):
+        """Add a task syncing a conference's NearlySoldOut entry, if the
+        transaction in progress commits."""
+        taskqueue.add(params={'websafeConferenceKey': wsck},
+                      url='/tasks/sync_nearly_sold_out', transactional=True)
+
+    @endpoints.method(LIST_GET_REQUEST, ConferenceForms,
             path='conferences/attending',
             http_method='GET', name='getConferencesToAttend')
     def getConferencesToAttend(self, request):
         """Get list of conferences that user has registered for."""
+        mask = parseFieldMask(request.fields, ConferenceForm)
         prof = self._getProfileFromUser()
-        conf_keys = [ndb.Key(urlsafe=wsck)
-            for wsck in prof.conferenceKeysToAttend]
-        conferences = ndb.get_multi(conf_keys)
-
-        # get organizers
-        organisers = [ndb.Key(Profile, conf.organizerUserId)
-            for conf in conferences]
-        profiles = ndb.get_multi(organisers)
-
-        # put display names in a dict for easier fetching
-        names = {}
-        for profile in profiles:
-            names[profile.key.id()] = profile.displayName
+        reg_keys = Registration.query(ancestor=prof.key).fetch(keys_only=True)
+        conf_keys = [ndb.Key(urlsafe=reg_key.id()) for reg_key in reg_keys]
 
         # return set of ConferenceForm objects per Conference
-        return ConferenceForms(items=[
-            self._copyConferenceToForm(conf, names[conf.organizerUserId])
-            for conf in conferences]
-        )
+        forms = self._listConferencesByKey(conf_keys).forms
+        applyFieldMask(forms.items, mask)
+        return forms
 
     @endpoints.method(CONF_GET_REQUEST, BooleanMessage,
             path='conference/{websafeConferenceKey}',
@@ -581,14 +1057,7 @@ class ConferenceApi(remote.Service):
 
     def _copySpeakerToForm(self, speaker):
         """Copy fields from Speaker to SpeakerForm."""
-        sf = SpeakerForm()
-        for field in sf.all_fields():
-            if hasattr(speaker, field.name):
-                setattr(sf, field.name, getattr(speaker, field.name))
-            elif field.name == 'websafeKey':
-                setattr(sf, field.name, speaker.key.urlsafe())
-        sf.check_initialized()
-        return sf
+        return copySpeaker(speaker)
 
     def _createSpeakerObject(self, request):
         """Create Speaker object, returning SpeakerForm request."""
@@ -607,8 +1076,9 @@ class ConferenceApi(remote.Service):
                 for field in request.all_fields()}
         del data['websafeKey']
 
-        # create Speaker
+        # create Speaker and outdate the cached speaker list
         Speaker(**data).put()
+        SPEAKERS_CACHE.delete('')
 
         return request
 
@@ -622,6 +1092,12 @@ class ConferenceApi(remote.Service):
             path='speakers', name='getSpeakers')
     def getSpeakers(self, request):
         """Get all speakers."""
+        # the list is cached encoded, so every call decodes its own copy
+        return protojson.decode_message(SpeakerForms, SPEAKERS_CACHE.get(
+            '', lambda: protojson.encode_message(self._buildSpeakers())))
+
+    def _buildSpeakers(self):
+        """Return SpeakerForms of all speakers, ordered by name."""
         speakers = Speaker.query().order(Speaker.name)
 
         # return individual SpeakerForm object per Speaker
@@ -633,59 +1109,20 @@ class ConferenceApi(remote.Service):
 
     def _copySessionToForm(self, sess):
         """Copy relevant fields from Session to SessionForm."""
-        sf = SessionForm()
-        for field in sf.all_fields():
-            if hasattr(sess, field.name):
-                # Convert date to string
-                if field.name == 'date':
-                    setattr(sf, field.name, str(getattr(sess, field.name)))
-                # Convert integer seconds to time string
-                elif field.name == 'startTime' and getattr(sess, field.name) != None:
-                    setattr(sf, field.name,
-                            getTimeString(getattr(sess, field.name)))
-                # Convert string to ENUM
-                elif field.name == 'typeOfSession':
-                    setattr(sf, field.name, getattr(
-                        TypeOfSession, getattr(sess, field.name)))
-                # Just copy the rest
-                else:
-                    setattr(sf, field.name, getattr(sess, field.name))
-            elif field.name == 'websafeKey':
-                setattr(sf, field.name, sess.key.urlsafe())
-        sf.check_initialized()
-        return sf
-
-    def _createSessionObject(self, request):
-        """Create new session object, returning SessionForm request."""
-        # User must be authenticated to create Session
-        user = endpoints.get_current_user()
-        if not user:
-            raise endpoints.UnauthorizedException('Authorization required.')
+        return copySession(sess)
+
+    def _sessionDataFromForm(self, form, conf):
+        """Validate a SessionForm and convert it into Session properties."""
         # 'name' is a required field
-        if not request.name:
+        if not form.name:
             raise endpoints.BadRequestException(
                 "Session 'name' field required.")
-        # 'websafeConferenceKey' is a required field
-        wsck = request.websafeConferenceKey
-        if not wsck:
-            raise endpoints.BadRequestException(
-                'websafeConferenceKey field required.')
-        # Get conference and check that it exists
-        conf = ndb.Key(urlsafe=wsck).get()
-        if not conf:
-            raise endpoints.NotFoundException(
-                'No conference found with key: %s' % (wsck,))
-
-        # check that user is owner
-        user_id = getUserId(user)
-        if user_id != conf.organizerUserId:
-            raise endpoints.ForbiddenException(
-                'Only the conference owner can add sessions.')
 
         # copy SessionForm/ProtoRPC Message into dict
-        data = {field.name: getattr(request, field.name)
-            for field in request.all_fields()}
+        data = {field.name: getattr(form, field.name)
+            for field in form.all_fields()}
         del data['websafeKey']
+        data['websafeConferenceKey'] = conf.key.urlsafe()
 
         # convert date to Date object and check against conference dates
         if data['date']:
@@ -704,45 +1141,157 @@ class ConferenceApi(remote.Service):
             data['typeOfSession'] = str(data['typeOfSession'])
         else:
             data['typeOfSession'] = str(TypeOfSession.NOT_SPECIFIED)
+        return data
 
-        # Generate Session Id and Key based on Conference key
-        s_id = Session.allocate_ids(size=1, parent=conf.key)[0]
-        s_key = ndb.Key(Session, s_id, parent=conf.key)
-        data['key'] = s_key
+    @ndb.tasklet
+    def _createSessionObjectsAsync(self, wsck, forms):
+        """Create new session objects for one conference, returning their
+        SessionForms."""
+        # User must be authenticated to create Session
+        user = endpoints.get_current_user()
+        if not user:
+            raise endpoints.UnauthorizedException('Authorization required.')
+        # 'websafeConferenceKey' is a required field
+        if not wsck:
+            raise endpoints.BadRequestException(
+                'websafeConferenceKey field required.')
+        if not forms:
+            raise endpoints.BadRequestException(
+                'At least one session is required.')
+        if len(forms) > MAX_SESSIONS_PER_BATCH:
+            raise endpoints.BadRequestException(
+                'At most %d sessions can be created at once.' %
+                MAX_SESSIONS_PER_BATCH)
+        # Start getting the conference and Session Ids based on its key
+        # (usually from a block reserved earlier, without an RPC), then
+        # resolve the user while the RPCs are in flight
+        c_key = ndb.Key(urlsafe=wsck)
+        conf_future = c_key.get_async()
+        s_ids_future = reserveIdsAsync(Session, c_key, size=len(forms))
+        user_id = getUserId(user)
 
-        # Store session object
-        Session(**data).put()
+        # check that conference exists
+        conf = yield conf_future
+        if not conf:
+            raise endpoints.NotFoundException(
+                'No conference found with key: %s' % (wsck,))
 
-        # If speakers were set on the session, add task to check for
-        # featured speaker for the conference and add to memcache.
-        if data['speakerKeys']:
-            taskqueue.add(
-                params={'websafeConferenceKey': wsck},
-                url='/tasks/set_featured_speaker'
-            )
+        # check that user is owner
+        if user_id != conf.organizerUserId:
+            raise endpoints.ForbiddenException(
+                'Only the conference owner can add sessions.')
+
+        # validate every session before writing any of them
+        datas = [self._sessionDataFromForm(form, conf) for form in forms]
+
+        # Generate Session Keys based on Conference key
+        first_id = yield s_ids_future
+        for i, data in enumerate(datas):
+            data['key'] = ndb.Key(Session, first_id + i, parent=conf.key)
+
+        # Store session objects. If speakers were set on any session, count
+        # them in the conference's speaker aggregate and add a task to check
+        # for featured speaker, all in the same transaction.
+        sessions = [Session(**data) for data in datas]
+        if any(data['speakerKeys'] for data in datas):
+            yield self._storeSpeakerSessionsAsync(conf.key, sessions)
+        else:
+            yield ndb.put_multi_async(sessions)
+        # the conference's session list changed; outdate its ETag
+        bumpVersion(MEMCACHE_SESSIONS_KEY + wsck)
+
+        # the stored entities are what we just put; no need to read them back
+        raise ndb.Return([self._copySessionToForm(sess) for sess in sessions])
+
+    @staticmethod
+    @ndb.transactional_tasklet
+    def _storeSpeakerSessionsAsync(c_key, sessions):
+        """Store sessions with speakers and count them in the speaker
+        aggregate; the featured speaker task is added only if they commit."""
+        version = yield addSessionsAsync(c_key, sessions)
+        yield taskqueue.Queue().add_async(
+            ConferenceApi._featuredSpeakerTask(c_key.urlsafe(), version),
+            transactional=True)
 
-        return self._copySessionToForm(s_key.get())
+    @staticmethod
+    def _featuredSpeakerTask(wsck, version):
+        """Return a task updating the featured speaker of a Conference from
+        an aggregate of at least version.
+
+        Transactional tasks can't be named, so the tasks of one window are
+        coalesced by their handler instead: they all run at the end of the
+        window, and the first one rebuilds for all of them.
+        """
+        now = time.time()
+        return taskqueue.Task(
+            params={'websafeConferenceKey': wsck, 'version': version},
+            countdown=FEATURED_SPEAKER_WINDOW - now % FEATURED_SPEAKER_WINDOW,
+            url='/tasks/set_featured_speaker')
 
     @endpoints.method(SessionForm, SessionForm,
             path='conference/newsession',
             http_method='POST', name='createSession')
     def createSession(self, request):
         """Create new session."""
-        return self._createSessionObject(request)
+        return self._createSessionObjectsAsync(
+            request.websafeConferenceKey, [request]).get_result()[0]
 
-    @endpoints.method(SESS_GET_REQUEST, SessionForms,
+    @endpoints.method(SESS_BATCH_POST_REQUEST, SessionForms,
+            path='conference/{websafeConferenceKey}/sessions',
+            http_method='POST', name='createSessions')
+    def createSessions(self, request):
+        """Create several sessions for a conference in one request."""
+        return SessionForms(sessions=self._createSessionObjectsAsync(
+            request.websafeConferenceKey, request.sessions).get_result())
+
+    @endpoints.method(SESS_CONDITIONAL_GET, SessionForms,
             path='conference/{websafeConferenceKey}/sessions',
             name='getConferenceSessions')
     def getConferenceSessions(self, request):
         """Return all sessions for requested conference."""
-        q = Session.query().filter(
-                Session.websafeConferenceKey == request.websafeConferenceKey)
-        q = q.order(Session.startTime)
+        wsck = request.websafeConferenceKey
+        c_key = parseKey(wsck, Conference)
+        if not c_key:
+            raise endpoints.BadRequestException(
+                'Invalid conference key: %s' % wsck)
+        mask = parseFieldMask(request.fields, SessionForm)
+        etag = self._versionETag(MEMCACHE_SESSIONS_KEY + wsck)
+        if etag and mask:
+            # a masked response is a different representation
+            etag = '%s;%s' % (etag, ','.join(sorted(mask)))
+        if etag and etag == self._ifNoneMatch(request):
+            return SessionForms(etag=etag, notModified=True)
+
+        # Sessions are children of their Conference, so an ancestor query
+        # is strongly consistent and sees sessions the ETag version counts.
+        q = Session.query(ancestor=c_key).order(Session.startTime)
         sessions = q.fetch()
 
         # return individual SessionForm object per Session
         return SessionForms(
-            sessions=[self._copySessionToForm(s) for s in sessions]
+            sessions=applyFieldMask(
+                [self._copySessionToForm(s) for s in sessions], mask),
+            etag=etag
+        )
+
+    @endpoints.method(SESS_GET_REQUEST, SessionSummaryForms,
+            path='conference/{websafeConferenceKey}/sessions/summary',
+            name='getConferenceSessionSummaries')
+    def getConferenceSessionSummaries(self, request):
+        """Return the list view fields of all sessions for requested
+        conference."""
+        mask = parseFieldMask(request.fields, SessionSummaryForm)
+        # A projection query reads the summary fields straight from the
+        # index, skipping highlights and the rest of each entity.
+        q = Session.query().filter(
+                Session.websafeConferenceKey == request.websafeConferenceKey)
+        q = q.order(Session.startTime)
+        sessions = q.fetch(projection=SESSION_SUMMARY_PROJECTION)
+
+        # return individual SessionSummaryForm object per Session
+        return SessionSummaryForms(
+            sessions=applyFieldMask(
+                [copySessionSummary(s) for s in sessions], mask)
         )
 
     @endpoints.method(SESS_TYPE_GET, SessionForms,
@@ -750,6 +1299,7 @@ class ConferenceApi(remote.Service):
             name='getConferenceSessionsByType')
     def getConferenceSessionsByType(self, request):
         """Return all sessions of a given type for a given conference."""
+        mask = parseFieldMask(request.fields, SessionForm)
         q = Session.query().filter(
                 Session.websafeConferenceKey == request.websafeConferenceKey,
                 Session.typeOfSession == request.typeOfSession)
@@ -758,7 +1308,8 @@ class ConferenceApi(remote.Service):
 
         # return individual SessionForm object per Session
         return SessionForms(
-            sessions=[self._copySessionToForm(s) for s in sessions]
+            sessions=applyFieldMask(
+                [self._copySessionToForm(s) for s in sessions], mask)
         )
 
     @endpoints.method(SESS_SPEAKER_GET, SessionForms,
@@ -767,6 +1318,7 @@ class ConferenceApi(remote.Service):
     def getSessionsBySpeaker(self, request):
         """Return all sessions from all conferences featuring a given
         speaker."""
+        mask = parseFieldMask(request.fields, SessionForm)
         q = Session.query().filter(
                 Session.speakerKeys == request.websafeSpeakerKey)
         q = q.order(Session.websafeConferenceKey)
@@ -774,7 +1326,8 @@ class ConferenceApi(remote.Service):
 
         # return individual SessionForm object per Session
         return SessionForms(
-            sessions=[self._copySessionToForm(s) for s in sessions]
+            sessions=applyFieldMask(
+                [self._copySessionToForm(s) for s in sessions], mask)
         )
 
     @endpoints.method(SESS_GET_REQUEST, SessionForms,
@@ -782,38 +1335,17 @@ class ConferenceApi(remote.Service):
             name='getSessionsPopular')
     def getSessionsPopular(self, request):
         """Returns top three most popular sessions for a given conference."""
-        # get all sessions for the conference
-        q = Session.query().filter(
-                Session.websafeConferenceKey == request.websafeConferenceKey)
-        sessions = q.fetch()
-
-        # Create a list of dicts that marry Session objects, their websafe keys
-        # and a count of how frequently they appear in user wishlists.
-        s_list = []
-        for s in sessions:
-            websafeKey = s.key.urlsafe()
-            frequency = Profile.query().\
-                filter(Profile.sessionWishlistKeys == websafeKey).\
-                count()
-            if frequency > 0:
-                s_list.append({
-                    'session': s,
-                    'websafeKey': websafeKey,
-                    'frequency': frequency
-                    })
-
-        # Sort the session list
-        s_list.sort(key=lambda session: session['frequency'], reverse=True)
-
-        # Find the top 3 sessions by their frequency rating
-        if len(s_list) >= 3:
-            top_three = s_list[:3]
-        else:
-            top_three = s_list  # In this case, will be less than three
+        mask = parseFieldMask(request.fields, SessionForm)
+        # Rank sessions by their sharded wishlist counters, then fetch
+        # only the winning sessions.
+        top_keys = getPopularSessionKeys(
+            request.websafeConferenceKey, POPULAR_SESSIONS_LIMIT)
+        sessions = ndb.get_multi([ndb.Key(urlsafe=k) for k in top_keys])
 
         # return individual SessionForm object per Session
         return SessionForms(
-            sessions=[self._copySessionToForm(s['session']) for s in top_three]
+            sessions=applyFieldMask(
+                [self._copySessionToForm(s) for s in sessions if s], mask)
         )
 
     @endpoints.method(SESS_HARD_QUERY_POST, SessionForms,
@@ -822,38 +1354,40 @@ class ConferenceApi(remote.Service):
             name='getSessionsHardQuery')
     def getSessionsHardQuery(self, request):
         """Return sessions not of certain type and before certain time."""
-        # Create filter node for websafeConferenceKey
-        wsck = request.websafeConferenceKey
-        confFilter = ndb.query.FilterNode('websafeConferenceKey', '=', wsck)
-
-        # Convert the passed in time string to integer seconds and store
-        # as a filter node object.
-        beforeTime = getSeconds(request.beforeTime)
-        timeFilter = ndb.query.FilterNode('startTime', '<', beforeTime)
-
-        # We can't use a '!=', as this will result in too many inequality
-        # filters due to the implementation (see README.md).
-        # Instead, we add equality filters for every session type except the
-        # one we're filtering out.
-        type_filters = []
-        for session_type in TypeOfSession:
-            if str(session_type) != request.notTypeOfSession:
-                filter_node = ndb.query.FilterNode(
-                                'typeOfSession', '=', str(session_type))
-                type_filters.append(filter_node)
-
-        q = Session.query(ndb.OR(
-                            ndb.AND(confFilter, timeFilter, type_filters[0]),
-                            ndb.AND(confFilter, timeFilter, type_filters[1]),
-                            ndb.AND(confFilter, timeFilter, type_filters[2]),
-                            ndb.AND(confFilter, timeFilter, type_filters[3]),
-                            ndb.AND(confFilter, timeFilter, type_filters[4]),
-                            ndb.AND(confFilter, timeFilter, type_filters[5])))
-        sessions = q.fetch()
+        mask = parseFieldMask(request.fields, SessionForm)
+        # We can't combine a '!=' with the time filter in one datastore
+        # query, as this will result in too many inequality filters (see
+        # README.md). The query planner runs the time filter in the
+        # datastore and checks the session type in memory.
+        filters = [
+            {'field': 'typeOfSession', 'operator': '!=',
+             'value': request.notTypeOfSession},
+            {'field': 'startTime', 'operator': '<',
+             'value': getSeconds(request.beforeTime)},
+        ]
+        sessions = runQuery(request.websafeConferenceKey, filters)
+
+        # return individual SessionForm object per Session
+        return SessionForms(
+            sessions=applyFieldMask(
+                [self._copySessionToForm(s) for s in sessions], mask)
+        )
+
+    @endpoints.method(SESS_SEARCH_POST, SessionForms,
+            path='conference/{websafeConferenceKey}/sessions/search',
+            http_method='POST',
+            name='searchSessions')
+    def searchSessions(self, request):
+        """Return sessions of a conference matching arbitrary filters on
+        type, start time, date, speaker and duration."""
+        mask = parseFieldMask(request.fields, SessionForm)
+        sessions = runQuery(request.websafeConferenceKey,
+                            parseFilters(request.filters))
 
         # return individual SessionForm object per Session
         return SessionForms(
-            sessions=[self._copySessionToForm(s) for s in sessions]
+            sessions=applyFieldMask(
+                [self._copySessionToForm(s) for s in sessions], mask)
         )
 
 # - - - Session Wishlists - - - - - - - - - - - - - - - - - -
@@ -861,17 +1395,39 @@ class ConferenceApi(remote.Service):
     def _addToWishlist(self, request):
         """Add a session to user's session wishlist."""
         prof = self._getProfileFromUser()
+        added = self._addToWishlistTxn(prof.key, request.websafeSessionKey)
+        if added:
+            # the ProfileForm lists the wishlist
+            self._profileChanged(prof.key)
+        return BooleanMessage(data=added)
 
-        # Add session key to profile object
-        wssk = request.websafeSessionKey
-        if wssk not in prof.sessionWishlistKeys:
-            prof.sessionWishlistKeys.append(wssk)
-            prof.put()
-            retval = True
-        else:
-            retval = False
+    @staticmethod
+    def _newWishlistEntry(p_key, wssk, counted=True):
+        """Return a WishlistEntry for the session, recording the conference
+        it belongs to (the parent of the Session key)."""
+        return WishlistEntry(
+            id=wssk, parent=p_key, counted=counted,
+            websafeConferenceKey=ndb.Key(urlsafe=wssk).parent().urlsafe())
 
-        return BooleanMessage(data=retval)
+    @ndb.transactional(xg=True)
+    def _addToWishlistTxn(self, p_key, wssk):
+        """Store a WishlistEntry for the session and count it towards the
+        session's popularity; return False if it was already there."""
+        # only existing sessions, which always have a Conference parent,
+        # may be counted
+        s_key = parseKey(wssk, Session)
+        if not s_key:
+            raise endpoints.BadRequestException(
+                'Invalid session key: %s' % wssk)
+        if not s_key.get():
+            raise endpoints.NotFoundException(
+                'No session found with key: %s' % wssk)
+        entry = self._newWishlistEntry(p_key, wssk)
+        if entry.key.get():
+            return False
+        entry.put()
+        changeSessionPopularity(s_key)
+        return True
 
     @endpoints.method(SESS_WISHLIST_POST, BooleanMessage,
             path='wishlist/add/{websafeSessionKey}',
@@ -880,19 +1436,23 @@ class ConferenceApi(remote.Service):
         """Add a session to user's session wishlist."""
         return self._addToWishlist(request)
 
-    @endpoints.method(message_types.VoidMessage, SessionForms,
+    @endpoints.method(LIST_GET_REQUEST, SessionForms,
             path='wishlist/all', name='getWishlistAll')
     def getWishlistAll(self, request):
         """Gets all sessions in user's wishlist across all conferences."""
+        mask = parseFieldMask(request.fields, SessionForm)
         prof = self._getProfileFromUser()
 
-        # Convert websafe keys to Session keys and get Sessions
-        swl_keys = [ndb.Key(urlsafe=s) for s in prof.sessionWishlistKeys]
+        # Convert wishlist entry ids to Session keys and get Sessions
+        entry_keys = WishlistEntry.query(ancestor=prof.key).fetch(
+            keys_only=True)
+        swl_keys = [ndb.Key(urlsafe=k.id()) for k in entry_keys]
         sessions = ndb.get_multi(swl_keys)
 
         # return individual SessionForm object per Session
         return SessionForms(
-            sessions=[self._copySessionToForm(s) for s in sessions]
+            sessions=applyFieldMask(
+                [self._copySessionToForm(s) for s in sessions if s], mask)
         )
 
     @endpoints.method(SESS_WISHLIST_GET, SessionForms,
@@ -900,21 +1460,21 @@ class ConferenceApi(remote.Service):
             name='getSessionsInWishList')
     def getSessionsInWishlist(self, request):
         """Get sessions in user's wishlist for given conference."""
+        mask = parseFieldMask(request.fields, SessionForm)
         prof = self._getProfileFromUser()
 
-        # Convert websafe keys to Session keys and get Sessions
-        swl_keys = [ndb.Key(urlsafe=s) for s in prof.sessionWishlistKeys]
+        # Find only this conference's wishlist entries, then convert their
+        # ids to Session keys and get Sessions
+        entry_keys = WishlistEntry.query(
+            WishlistEntry.websafeConferenceKey == request.websafeConferenceKey,
+            ancestor=prof.key).fetch(keys_only=True)
+        swl_keys = [ndb.Key(urlsafe=k.id()) for k in entry_keys]
         sessions = ndb.get_multi(swl_keys)
 
-        # Return only sessions matching requested conference
-        conf_sessions = []
-        for s in sessions:
-            if s.websafeConferenceKey == request.websafeConferenceKey:
-                conf_sessions.append(s)
-
         # return individual SessionForm object per Session
         return SessionForms(
-            sessions=[self._copySessionToForm(s) for s in conf_sessions]
+            sessions=applyFieldMask(
+                [self._copySessionToForm(s) for s in sessions if s], mask)
         )
 
 # - - - Featured Speaker - - - - - - - - - - - - - - - - - - -
@@ -924,96 +1484,201 @@ class ConferenceApi(remote.Service):
         """Create featured speaker and sessions for a Conference;
         called when new session is created with speaker(s) set.
         """
+        # A task whose sessions are already counted in the cached featured
+        # speaker has nothing to do; the rest recompute from the committed
+        # aggregate, which is a single get, so retries are harmless.
         wsck = request.get('websafeConferenceKey')
-        # Get all sessions for conference. We're specifying an ancestor here
-        # to ensure our query uses "strong consistency" and includes the
-        # just-added session.
-        sessions = ndb.gql("SELECT * "
-                           "FROM Session "
-                           "WHERE ANCESTOR IS :1 ",
-                           ndb.Key(urlsafe=wsck)).fetch()
-        speakers_sessions = {}
-        # Loop through sessions
-        for s in sessions:
-            if s.speakerKeys:
-                # Loop through speakers for the session
-                for s_key in s.speakerKeys:
-                    if s_key in speakers_sessions.keys():
-                        speakers_sessions[s_key].append(s)
-                    else:
-                        speakers_sessions[s_key] = [s]
-        featured = {'sessions': [],
-                    'num_of_sessions': 0,
-                    'speaker_key': ""}
-        for s_key in speakers_sessions:
-            if len(speakers_sessions[s_key]) > featured['num_of_sessions']:
-                featured['sessions'] = speakers_sessions[s_key]
-                featured['num_of_sessions'] = len(speakers_sessions[s_key])
-                featured['speaker_key'] = s_key
-        if featured['num_of_sessions'] > 1:
+        version = request.get('version')
+        cached = FEATURED_SPEAKER_CACHE.peek(wsck)
+        # tasks queued before versions were sent have none; they rebuild
+        if version and cached is not None and cached[0] >= int(version):
+            return cached[1]
+        return ConferenceApi._setFeaturedSpeaker(wsck)
+
+    @staticmethod
+    def _setFeaturedSpeaker(wsck):
+        """Format the featured speaker of a Conference and write it through
+        to the featured speaker cache, unless one built from a newer
+        aggregate is cached."""
+        built = ConferenceApi._buildFeaturedSpeaker(wsck)
+        # The cache key consists of a text string plus a websafe Conference
+        # key. This allows us to store featured speakers for multiple
+        # conferences simultaneously.
+        return FEATURED_SPEAKER_CACHE.setIf(
+            wsck, built, lambda cached: cached[0] <= built[0])[1]
+
+    @staticmethod
+    def _buildFeaturedSpeaker(wsck):
+        """Format the featured speaker of a Conference from its speaker
+        aggregate; return (aggregate version, featured speaker)."""
+        c_key = parseKey(wsck, Conference)
+        if not c_key or not c_key.get():
+            raise endpoints.NotFoundException(
+                'No conference found with key: %s' % wsck)
+        # The aggregate is a single entity kept up to date as sessions are
+        # stored, so there is no need to scan the conference's sessions.
+        tally = getSpeakers(c_key)
+        featured = featuredSpeaker(tally)
+        if featured:
             # If there is a featured speaker (more than one session in this
-            # conference), then get speaker data, format message data and
-            # set it in memcache.
-            speaker = ndb.Key(urlsafe=featured['speaker_key']).get()
+            # conference), then get speaker data and format message data.
+            speaker = ndb.Key(urlsafe=featured.speakerKey).get()
             featured_speaker = FEATURED_SPEAKER_TPL % (
-                speaker.name,
-                ', '.join(s.name for s in featured['sessions'])
-            )
-            # Memcache key consists of a text string plus a websafe Conference
-            # key. This allows us to store featured speakers for multiple
-            # conferences simultaneously.
-            memcache.set(
-                MEMCACHE_FEATURED_SPEAKER_KEY + wsck, featured_speaker)
+                speaker.name, ', '.join(featured.sessionNames))
         else:
-            # Even if this speaker wasn't a featured speaker,
-            # don't delete memcache entry, as there may be another featured
-            # speaker already set for the conference.
             featured_speaker = ""
+        return tally.version, featured_speaker
 
-        return featured_speaker
+    @staticmethod
+    def _storeSpeakerAggregates(request):
+        """Store the speaker aggregate of every conference that has none,
+        one batch per task."""
+        runBatch(request, Conference.query(), SPEAKERS_BACKFILL_BATCH_SIZE,
+                 '/tasks/store_speakers', storeSpeakers, keys_only=True)
 
     @endpoints.method(FEATURED_SPEAKER_GET, StringMessage,
             path='conference/{websafeConferenceKey}/featuredspeaker/get',
             name='getFeaturedSpeaker')
     def getFeaturedSpeaker(self, request):
-        """Reaturn Featured Speaker and Sessions from memcache."""
+        """Reaturn Featured Speaker and Sessions from the cache."""
         wsck = request.websafeConferenceKey
-        memcache_key = MEMCACHE_FEATURED_SPEAKER_KEY + wsck
-        return StringMessage(data=memcache.get(memcache_key) or "")
+        if not parseKey(wsck, Conference):
+            raise endpoints.NotFoundException(
+                'No conference found with key: %s' % wsck)
+        # rebuild from the speaker aggregate if both tiers lost the entry;
+        # unknown conferences raise before anything is cached
+        featured_speaker = FEATURED_SPEAKER_CACHE.get(
+            wsck, lambda: self._buildFeaturedSpeaker(wsck))[1]
+        return StringMessage(data=featured_speaker)
 
 # - - - Announcements - - - - - - - - - - - - - - - - - - - -
 
     @staticmethod
-    def _cacheAnnouncement():
-        """Create Announcement & assign to memcache; used by
-        memcache cron job & putAnnouncement().
-        """
-        confs = Conference.query(ndb.AND(
-            Conference.seatsAvailable <= 5,
-            Conference.seatsAvailable > 0)
-        ).fetch(projection=[Conference.name])
+    def _isNearlySoldOut(seats_left):
+        """Return True if a conference with seats_left belongs in the
+        announcement."""
+        return 0 < seats_left <= NEARLY_SOLD_OUT_SEATS
+
+    @staticmethod
+    def _syncNearlySoldOut(conf):
+        """Add conf to or remove it from the NearlySoldOut index when its
+        seats have crossed into or out of the 1..5 band."""
+        # read the index and the conference's pools in one batch
+        index_key = ndb.Key(NearlySoldOut, NEARLY_SOLD_OUT_ID)
+        entities = ndb.get_multi([index_key] + poolKeys(conf))
+        index = entities[0]
+        pools = dict((p.key, p) for p in entities[1:] if p)
+        in_band = ConferenceApi._isNearlySoldOut(sumSeatPools(conf, pools))
+
+        wsck = conf.key.urlsafe()
+        listed = [e for e in (index.conferences if index else [])
+                  if e.websafeConferenceKey == wsck]
+        if in_band == bool(listed) and (
+                not listed or listed[0].name == conf.name):
+            # nothing crossed the band; most registrations end here
+            return
+
+        index = ConferenceApi._updateNearlySoldOut(conf.key)
+        ConferenceApi._setAnnouncement(index)
+
+    @staticmethod
+    def _syncNearlySoldOutTask(request):
+        """Sync the NearlySoldOut entry of a conference whose seats
+        changed; called from a task added by the registration."""
+        conf = ndb.Key(urlsafe=request.get('websafeConferenceKey')).get()
+        if conf:
+            ConferenceApi._syncNearlySoldOut(conf)
+
+    @staticmethod
+    def _backfillNearlySoldOut(request):
+        """List conferences stored before the NearlySoldOut index existed,
+        one batch per task."""
+        runBatch(request, Conference.query(), NEARLY_SOLD_OUT_BATCH_SIZE,
+                 '/tasks/backfill_nearly_sold_out',
+                 ConferenceApi._syncNearlySoldOut)
+
+    @staticmethod
+    @ndb.transactional(xg=True)
+    def _updateNearlySoldOut(c_key):
+        """Recompute a conference's entry in the NearlySoldOut index."""
+        # Reading the pools inside the transaction makes it retry if a
+        # registration changes them before it commits.
+        conf = c_key.get()
+        pools = dict((p.key, p) for p in ndb.get_multi(poolKeys(conf)) if p)
+        seats_left = sumSeatPools(conf, pools)
+
+        index_key = ndb.Key(NearlySoldOut, NEARLY_SOLD_OUT_ID)
+        index = index_key.get() or NearlySoldOut(key=index_key)
+        wsck = c_key.urlsafe()
+        index.conferences = [e for e in index.conferences
+                             if e.websafeConferenceKey != wsck]
+        if ConferenceApi._isNearlySoldOut(seats_left):
+            index.conferences.append(NearlySoldOutEntry(
+                websafeConferenceKey=wsck, name=conf.name))
+        index.version += 1
+        index.put()
+        return index
+
+    @staticmethod
+    def _setAnnouncement(index):
+        """Format the announcement from the NearlySoldOut index and write
+        it through to the announcement cache, unless the cache already
+        holds one built from a newer version of the index."""
+        version = index.version if index else 0
+        return ConferenceApi._announcementText(ANNOUNCEMENT_CACHE.setIf(
+            '', (version, ConferenceApi._buildAnnouncement(index)),
+            lambda cached: cached[0] <= version))
+
+    @staticmethod
+    def _announcementText(cached):
+        """Return the text of a cached (version, announcement) pair."""
+        return cached[1]
 
-        if confs:
+    @staticmethod
+    def _buildAnnouncement(index):
+        """Format the announcement from the NearlySoldOut index."""
+        if index and index.conferences:
             # If there are almost sold out conferences,
-            # format announcement and set it in memcache
+            # format announcement
             announcement = ANNOUNCEMENT_TPL % (
-                ', '.join(conf.name for conf in confs))
-            memcache.set(MEMCACHE_ANNOUNCEMENTS_KEY, announcement)
+                ', '.join(e.name for e in index.conferences))
         else:
-            # If there are no sold out conferences,
-            # delete the memcache announcements entry
+            # If there are no sold out conferences, cache the empty
+            # announcement so reads don't fall through to the datastore
             announcement = ""
-            memcache.delete(MEMCACHE_ANNOUNCEMENTS_KEY)
-
         return announcement
 
-    @endpoints.method(message_types.VoidMessage, StringMessage,
+    @staticmethod
+    def _loadAnnouncement():
+        """Return (version, announcement) built from the stored index."""
+        index = ndb.Key(NearlySoldOut, NEARLY_SOLD_OUT_ID).get()
+        return (index.version if index else 0,
+                ConferenceApi._buildAnnouncement(index))
+
+    @staticmethod
+    def _cacheAnnouncement():
+        """Create Announcement & assign to the cache; used by the
+        hourly cron job.
+        """
+        return ConferenceApi._setAnnouncement(
+            ndb.Key(NearlySoldOut, NEARLY_SOLD_OUT_ID).get())
+
+    @endpoints.method(ANNOUNCEMENT_GET, StringMessage,
             path='conference/announcement/get', http_method='GET',
             name='getAnnouncement')
     def getAnnouncement(self, request):
-        """Return Announcement from memcache."""
-        return StringMessage(
-            data=memcache.get(MEMCACHE_ANNOUNCEMENTS_KEY) or "")
-
-
-api = endpoints.api_server([ConferenceApi])  # register API
+        """Return Announcement from the cache."""
+        # rebuild from the NearlySoldOut index if both tiers lost the entry
+        announcement = self._announcementText(ANNOUNCEMENT_CACHE.get(
+            '', self._loadAnnouncement))
+        # the announcement is a single short string, so its hash makes an
+        # exact ETag without a version counter
+        etag = hashlib.md5(announcement.encode('utf-8')).hexdigest()
+        if etag == self._ifNoneMatch(request):
+            return StringMessage(data='', etag=etag, notModified=True)
+        return StringMessage(data=announcement, etag=etag)
+
+
+api = instrumentApp(endpoints.api_server([ConferenceApi]),  # register API
+                    ['ConferenceApi.' + name
+                     for name in ConferenceApi.all_remote_methods()])
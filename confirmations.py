@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+"""confirmations.py
+
+Batched delivery of conference creation confirmation emails.
+
+Each new conference adds a task, tagged with the recipient, to the
+confirmation-emails pull queue instead of a push task per email. A
+cron-driven worker leases the tasks by tag, so it gets all queued
+confirmations of one recipient together, sends them as a single digest
+email and sends at most MAX_DIGESTS_PER_RUN digests per run. Mail quota and
+task overhead grow with the number of recipients rather than the number of
+conferences.
+
+"""
+
+import json
+
+from google.appengine.api import app_identity
+from google.appengine.api import mail
+from google.appengine.api import taskqueue
+
+QUEUE_NAME = 'confirmation-emails'
+LEASE_SECONDS = 60
+LEASE_BATCH_SIZE = 100
+MAX_DIGESTS_PER_RUN = 50
+
+
+def queueConfirmationAsync(email, conference_info, transactional=False):
+    """Queue a confirmation for a conference created by email's owner.
+
+    With transactional=True the task is only added if the datastore
+    transaction in progress commits.
+
+    Returns:
+        rpc: UserRPC of the add; ndb tasklets can yield it
+    """
+    return taskqueue.Queue(QUEUE_NAME).add_async(taskqueue.Task(
+        payload=json.dumps({'email': email,
+                            'conferenceInfo': conference_info}),
+        method='PULL',
+        tag=email), transactional=transactional)
+
+
+def _sendDigest(email, infos):
+    """Send one email confirming all conferences in infos."""
+    if len(infos) == 1:
+        subject = 'You created a new Conference!'
+        intro = 'Hi, you have created a following conference:'
+    else:
+        subject = 'You created %d new Conferences!' % len(infos)
+        intro = 'Hi, you have created the following conferences:'
+    mail.send_mail(
+        'noreply@%s.appspotmail.com' % (
+            app_identity.get_application_id()),     # from
+        email,                                      # to
+        subject,                                    # subj
+        '%s\r\n\r\n%s' % (intro, '\r\n\r\n'.join(infos))   # body
+    )
+
+
+def _leaseDigest(queue):
+    """Lease every queued confirmation of the recipient of the oldest one.
+
+    Returns:
+        (email, tasks): the recipient and their leased tasks, or
+        (None, []) if the queue is empty
+    """
+    tasks = queue.lease_tasks_by_tag(LEASE_SECONDS, LEASE_BATCH_SIZE)
+    if not tasks:
+        return None, []
+    email = tasks[0].tag
+    batch = tasks
+    while len(batch) == LEASE_BATCH_SIZE:
+        batch = queue.lease_tasks_by_tag(LEASE_SECONDS, LEASE_BATCH_SIZE,
+                                         tag=email)
+        tasks.extend(batch)
+    return email, tasks
+
+
+def sendConfirmationDigests():
+    """Lease queued confirmations and send them as per-recipient digests.
+
+    Each recipient gets one digest per run, however many confirmations are
+    queued for them. Tasks are only deleted once their digest was sent;
+    tasks of a failed send come back when their lease expires.
+
+    Returns:
+        sent: number of digest emails sent
+    """
+    queue = taskqueue.Queue(QUEUE_NAME)
+    sent = 0
+    while sent < MAX_DIGESTS_PER_RUN:
+        email, tasks = _leaseDigest(queue)
+        if not tasks:
+            break
+        _sendDigest(email, [json.loads(task.payload)['conferenceInfo']
+                            for task in tasks])
+        queue.delete_tasks(tasks)
+        sent += 1
+    return sent
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+"""counters.py
+
+Sharded counters for Conference Central. Each session's wishlist popularity
+is spread over several root entities so concurrent wishlist writes for a hot
+session don't contend on a single entity group.
+
+"""
+
+import random
+
+from google.appengine.api import memcache
+from google.appengine.ext import ndb
+
+from models import SessionPopularityShard
+
+NUM_POPULARITY_SHARDS = 20
+MEMCACHE_POPULAR_SESSIONS_KEY = "POPULAR_SESSIONS_"
+POPULAR_SESSIONS_TTL = 60
+
+
+def _shardId(wssk, index):
+    """Return the datastore id of a session's popularity shard."""
+    return '%s-%d' % (wssk, index)
+
+
+@ndb.transactional
+def _changeShard(shard_id, wssk, wsck, delta):
+    """Apply delta to a single popularity shard, creating it if needed."""
+    shard = SessionPopularityShard.get_by_id(shard_id)
+    if not shard:
+        shard = SessionPopularityShard(id=shard_id,
+                                       websafeSessionKey=wssk,
+                                       websafeConferenceKey=wsck)
+    shard.count += delta
+    shard.put()
+
+
+def changeSessionPopularity(s_key, delta=1):
+    """Add delta to the wishlist popularity of a session.
+
+    Use delta=1 when a session is added to a wishlist and delta=-1 when it
+    is removed. Joins the caller's transaction if there is one.
+
+    Args:
+        s_key: ndb.Key of an existing Session; its parent is the
+            Conference the popularity is ranked in
+        delta: amount to add to the counter
+    """
+    wssk = s_key.urlsafe()
+    index = random.randint(0, NUM_POPULARITY_SHARDS - 1)
+    _changeShard(_shardId(wssk, index), wssk, s_key.parent().urlsafe(),
+                 delta)
+
+
+def getPopularSessionKeys(wsck, limit):
+    """Return websafe keys of the most wishlisted sessions of a conference.
+
+    Sums all popularity shards of the conference with a single query. The
+    ranking is snapshotted in memcache for POPULAR_SESSIONS_TTL seconds.
+
+    Args:
+        wsck: websafe Conference key
+        limit: maximum number of sessions to return
+    Returns:
+        ranked: list of websafe Session keys, most popular first
+    """
+    memcache_key = MEMCACHE_POPULAR_SESSIONS_KEY + wsck
+    ranked = memcache.get(memcache_key)
+    if ranked is None:
+        totals = {}
+        shards = SessionPopularityShard.query(
+            SessionPopularityShard.websafeConferenceKey == wsck)
+        for shard in shards:
+            totals[shard.websafeSessionKey] = (
+                totals.get(shard.websafeSessionKey, 0) + shard.count)
+        ranked = sorted((k for k in totals if totals[k] > 0),
+                        key=lambda k: (-totals[k], k))
+        memcache.set(memcache_key, ranked, time=POPULAR_SESSIONS_TTL)
+    return ranked[:limit]
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+
+"""fieldmask.py
+
+Partial responses for list endpoints. A field mask is a comma separated
+list of form field names; every other field of the returned forms is
+cleared, so protojson leaves it out of the response.
+
+"""
+
+import endpoints
+
+
+def parseFieldMask(fields, message_class):
+    """Parse a field mask for message_class.
+
+    Args:
+        fields: comma separated field names, or None for no mask
+        message_class: ProtoRPC message class the mask applies to
+    Returns:
+        mask: frozenset of field names, or None to return every field
+    """
+    if not fields:
+        return None
+    mask = frozenset(name.strip() for name in fields.split(',')
+                     if name.strip())
+    known = frozenset(field.name for field in message_class.all_fields())
+    unknown = mask - known
+    if unknown:
+        raise endpoints.BadRequestException(
+            "Unknown fields in mask: %s" % ', '.join(sorted(unknown)))
+    return mask
+
+
+def applyFieldMask(forms, mask):
+    """Clear the fields of each form that are not in mask; returns forms."""
+    if mask is None:
+        return forms
+    for form in forms:
+        for field in form.all_fields():
+            if field.name not in mask:
+                form.reset(field.name)
+    return forms
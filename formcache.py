@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+"""formcache.py
+
+Versioned read-through memcache cache for fully built ProtoRPC forms.
+
+Every cached object has a version counter in memcache that writers bump
+after committing a change. A cached form is only served while its stored
+version matches the current counter, and a form built from older data never
+replaces one stored under a newer version.
+
+"""
+
+import time
+
+from google.appengine.api import memcache
+from protorpc import protojson
+
+MEMCACHE_VERSION_PREFIX = "VERSION_"
+FORM_CACHE_TTL = 3600
+
+
+def _initialVersion():
+    """Seed for a missing counter; keeps versions increasing after the
+    counter itself has been evicted."""
+    return int(time.time() * 1000)
+
+
+def bumpVersion(name):
+    """Mark the cached form for name as outdated; return the new version."""
+    version_key = MEMCACHE_VERSION_PREFIX + name
+    version = memcache.incr(version_key, initial_value=_initialVersion())
+    if version is None:
+        # memcache unavailable: drop the form so it can't be served stale
+        memcache.delete(name)
+    return version
+
+
+def _storeForm(client, name, version, form, cached):
+    """Store form unless a form of the same or a newer version is cached.
+
+    cached is the (version, data) pair read with for_cas=True, or None.
+    """
+    value = (version, protojson.encode_message(form))
+    if cached is None:
+        client.add(name, value, time=FORM_CACHE_TTL)
+    elif cached[0] < version:
+        client.cas(name, value, time=FORM_CACHE_TTL)
+
+
+def _seedVersion(client, version_key):
+    """Start a missing version counter; return the version now stored."""
+    version = _initialVersion()
+    if not client.add(version_key, version):
+        version = client.get(version_key)
+    return version
+
+
+def getVersion(name):
+    """Return the current version of name, starting its counter if missing.
+
+    Versions only change after a write has committed, so a version read
+    before building a form never claims newer data than the form has.
+    Returns None if memcache is unavailable.
+    """
+    client = memcache.Client()
+    version_key = MEMCACHE_VERSION_PREFIX + name
+    version = client.get(version_key)
+    if version is None:
+        version = _seedVersion(client, version_key)
+    return version
+
+
+def putForm(name, version, form):
+    """Refresh the cached form after a write that bumped it to version."""
+    if version is None:
+        return
+    client = memcache.Client()
+    cached = client.gets(name)
+    _storeForm(client, name, version, form, cached)
+
+
+def getForm(name, message_type, build):
+    """Return the cached form for name, building and caching it on a miss.
+
+    Args:
+        name: memcache key of the form
+        message_type: ProtoRPC message class of the form
+        build: callable returning a freshly built form
+    Returns:
+        form: instance of message_type
+    """
+    client = memcache.Client()
+    version_key = MEMCACHE_VERSION_PREFIX + name
+    cached = client.get_multi([version_key, name], for_cas=True)
+    version = cached.get(version_key)
+    entry = cached.get(name)
+    if version is None:
+        version = _seedVersion(client, version_key)
+    if entry is not None and entry[0] == version:
+        return protojson.decode_message(message_type, entry[1])
+
+    # Capture the version before building, so a form built from data that
+    # a concurrent writer changes is stored under the outdated version.
+    form = build()
+    if version is not None:
+        _storeForm(client, name, version, form, entry)
+    return form
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+"""formcopy.py
+
+Precompiled copy plans from ndb entities to ProtoRPC form messages.
+
+A plan is worked out once per (model, message) pair: which message fields
+come from which entity properties, how each value is converted, and whether
+the entity key is copied as websafeKey. Copying an entity then runs the
+plan without any per-field reflection or name matching.
+
+"""
+
+from protorpc import messages
+from google.appengine.ext import ndb
+
+
+def _skipNone(convert):
+    """Wrap convert so None values are copied unchanged."""
+    def converter(value):
+        if value is None:
+            return None
+        return convert(value)
+    return converter
+
+
+def _enumConverter(enum_type):
+    """Return a converter from a stored enum name to its Enum value."""
+    def converter(value):
+        return getattr(enum_type, value)
+    return _skipNone(converter)
+
+
+def compileCopyPlan(model_class, message_class, converters=None):
+    """Build a function copying model_class entities to message_class.
+
+    Message fields named like a model property are copied from it:
+        - DateProperty values are converted with str(), as the original
+          reflection-based copies did (a missing date becomes 'None')
+        - EnumField values are looked up by name on the Enum
+        - everything else is copied as is
+    A websafeKey field without a matching property gets the entity key.
+
+    Args:
+        model_class: ndb.Model subclass to copy from
+        message_class: messages.Message subclass to copy to
+        converters: optional dict of field name -> callable overriding the
+            conversion of that field; not called for None values
+    Returns:
+        copy: function(entity, **overrides) returning a message_class
+            instance; overrides set fields after the plan has run
+    """
+    converters = converters or {}
+    plan = []
+    copy_key = False
+    for field in message_class.all_fields():
+        prop = model_class._properties.get(field.name)
+        if prop is None:
+            copy_key = copy_key or field.name == 'websafeKey'
+        elif field.name in converters:
+            plan.append((field.name, _skipNone(converters[field.name])))
+        elif isinstance(prop, ndb.DateProperty):
+            plan.append((field.name, str))
+        elif isinstance(field, messages.EnumField):
+            plan.append((field.name, _enumConverter(field.type)))
+        else:
+            plan.append((field.name, None))
+    plan = tuple(plan)
+    needs_check = any(field.required for field in message_class.all_fields())
+
+    def copy(entity, **overrides):
+        values = {}
+        for name, convert in plan:
+            value = getattr(entity, name)
+            values[name] = convert(value) if convert else value
+        if copy_key:
+            values['websafeKey'] = entity.key.urlsafe()
+        values.update(overrides)
+        msg = message_class(**values)
+        if needs_check:
+            msg.check_initialized()
+        return msg
+
+    return copy
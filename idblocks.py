@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+"""idblocks.py
+
+Pre-reserved blocks of datastore ids for new child entities.
+
+Instead of an allocate_ids RPC per create, ids are allocated in blocks per
+(kind, parent) and handed out from instance memory, so most creates only
+need their final put. Ids in a block are reserved by the datastore for
+that parent and never reissued: ids left over when a block is replaced,
+evicted or lost with its instance only leave gaps in the id sequence.
+
+"""
+
+import threading
+from collections import OrderedDict
+
+from google.appengine.ext import ndb
+
+DEFAULT_BLOCK_SIZE = 20
+MAX_BLOCKS = 1000
+
+_lock = threading.Lock()
+# (kind, websafe parent key) -> [next free id, last id of the block]
+_blocks = OrderedDict()
+
+
+def _takeIds(block_key, size):
+    """Take size consecutive ids from a reserved block; return the first
+    one, or None if the block is missing or has too few ids left."""
+    with _lock:
+        block = _blocks.pop(block_key, None)
+        if block is None:
+            return None
+        first = None
+        if block[1] - block[0] + 1 >= size:
+            first = block[0]
+            block[0] += size
+        if block[0] <= block[1]:
+            # re-inserting keeps the most recently used blocks last
+            _blocks[block_key] = block
+        return first
+
+
+def _keepIds(block_key, first, last):
+    """Store ids first..last as the reserved block of block_key."""
+    if first > last:
+        return
+    with _lock:
+        _blocks.pop(block_key, None)
+        _blocks[block_key] = [first, last]
+        while len(_blocks) > MAX_BLOCKS:
+            _blocks.popitem(last=False)
+
+
+@ndb.tasklet
+def reserveIdsAsync(model_class, parent, size=1,
+                    block_size=DEFAULT_BLOCK_SIZE):
+    """Return the first of size consecutive ids for new model_class
+    entities under parent.
+
+    Args:
+        model_class: ndb.Model subclass of the new entities
+        parent: ndb.Key of their parent
+        size: number of ids needed
+        block_size: number of ids to allocate when the block runs out
+    Returns:
+        first: first id; ids first..first + size - 1 are reserved
+    """
+    block_key = (model_class._get_kind(), parent.urlsafe())
+    first = _takeIds(block_key, size)
+    if first is None:
+        # block exhausted: allocate a new one and keep what's left of it
+        first, last = yield model_class.allocate_ids_async(
+            size=max(size, block_size), parent=parent)
+        _keepIds(block_key, first + size, last)
+    raise ndb.Return(first)
+
+
+def reserveIds(model_class, parent, size=1, block_size=DEFAULT_BLOCK_SIZE):
+    """Synchronous version of reserveIdsAsync."""
+    return reserveIdsAsync(model_class, parent, size,
+                           block_size).get_result()
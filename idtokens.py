@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+"""idtokens.py
+
+Local verification of Google ID tokens.
+
+verifyIdToken checks a token's RS256 signature against Google's published
+signing keys and validates its claims, without a call to the tokeninfo
+endpoint. The keys are fetched as a JSON Web Key Set from CERTS_URL and
+cached in memcache; a token signed with a key that isn't cached yet makes
+the set be fetched again, so rotated keys are picked up. Such refetches
+happen at most once per REFETCH_INTERVAL, on each instance and across
+instances, since the key id is chosen by the caller.
+
+Needs the pycrypto library (see app.yaml).
+
+"""
+
+import base64
+import json
+import os
+import time
+
+from Crypto.Hash import SHA256
+from Crypto.PublicKey import RSA
+from Crypto.Signature import PKCS1_v1_5
+from google.appengine.api import memcache
+from google.appengine.api import urlfetch
+
+# Google's signing keys; point ID_TOKEN_CERTS_URL at a local stub in tests
+CERTS_URL = os.environ.get(
+    'ID_TOKEN_CERTS_URL', 'https://www.googleapis.com/oauth2/v3/certs')
+CERTS_DEADLINE = 5
+MEMCACHE_CERTS_KEY = "ID_TOKEN_CERTS"
+CERTS_TTL = 3600
+MEMCACHE_REFETCH_KEY = "ID_TOKEN_CERTS_REFETCH"
+REFETCH_INTERVAL = 60
+CLOCK_SKEW = 300
+
+# time of this instance's last fetch of the signing keys
+_last_fetch = [0]
+
+
+class InvalidTokenError(Exception):
+    """The token is malformed, badly signed or not valid for this app."""
+
+
+def _b64decode(data):
+    """Decode unpadded base64url, as used in JWTs and JWKs."""
+    data = str(data)
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def _toLong(data):
+    """Decode a base64url big-endian integer of a JWK."""
+    return long(_b64decode(data).encode('hex'), 16)
+
+
+def _fetchSigningKeys():
+    """Fetch Google's signing keys and cache them in memcache.
+
+    Returns:
+        dict mapping key id to (modulus, exponent) of each RSA key
+    """
+    _last_fetch[0] = time.time()
+    resp = urlfetch.fetch(CERTS_URL, deadline=CERTS_DEADLINE)
+    if resp.status_code != 200:
+        raise InvalidTokenError('Unable to fetch signing keys')
+    keys = dict((k['kid'], (_toLong(k['n']), _toLong(k['e'])))
+                for k in json.loads(resp.content).get('keys', [])
+                if k.get('kty') == 'RSA')
+    memcache.set(MEMCACHE_CERTS_KEY, keys, time=CERTS_TTL)
+    return keys
+
+
+def _mayRefetch():
+    """Return True if the signing keys may be fetched again for an unknown
+    key id, which is allowed once per REFETCH_INTERVAL."""
+    if time.time() - _last_fetch[0] < REFETCH_INTERVAL:
+        return False
+    return memcache.add(MEMCACHE_REFETCH_KEY, True, time=REFETCH_INTERVAL)
+
+
+def _signingKey(kid):
+    """Return the RSA public key with id kid.
+
+    Raises:
+        InvalidTokenError: if Google doesn't publish the key, or the keys
+        were fetched too recently to look for it again
+    """
+    keys = memcache.get(MEMCACHE_CERTS_KEY)
+    if keys is None or (kid not in keys and _mayRefetch()):
+        keys = _fetchSigningKeys()
+    if kid not in keys:
+        raise InvalidTokenError('Unknown signing key: %r' % kid)
+    return RSA.construct(keys[kid])
+
+
+def verifyIdToken(token, now, issuers, audiences):
+    """Verify a Google ID token.
+
+    Args:
+        token: the encoded JWT
+        now: current time in seconds since the epoch
+        issuers: accepted values of the iss claim
+        audiences: accepted values of the aud claim (client ids)
+    Returns:
+        claims: dict of the token's claims; sub is the user id and exp the
+        expiry time
+    Raises:
+        InvalidTokenError: if the token is malformed, its signature doesn't
+        match a Google signing key, it has expired or it was issued by or
+        for someone else
+    """
+    try:
+        header_b64, claims_b64, signature_b64 = str(token).split('.')
+        header = json.loads(_b64decode(header_b64))
+        claims = json.loads(_b64decode(claims_b64))
+        signature = _b64decode(signature_b64)
+    except (TypeError, ValueError):
+        raise InvalidTokenError('Malformed token')
+    if not isinstance(header, dict) or not isinstance(claims, dict):
+        raise InvalidTokenError('Malformed token')
+    if header.get('alg') != 'RS256':
+        raise InvalidTokenError('Unexpected algorithm: %r' %
+                                header.get('alg'))
+
+    key = _signingKey(header.get('kid'))
+    digest = SHA256.new('%s.%s' % (header_b64, claims_b64))
+    if not PKCS1_v1_5.new(key).verify(digest, signature):
+        raise InvalidTokenError('Invalid signature')
+
+    if claims.get('iss') not in issuers:
+        raise InvalidTokenError('Unexpected issuer')
+    if claims.get('aud') not in audiences:
+        raise InvalidTokenError('Unexpected audience')
+    if not claims.get('sub'):
+        raise InvalidTokenError('Token has no subject')
+    try:
+        issued, expires = float(claims['iat']), float(claims['exp'])
+    except (KeyError, TypeError, ValueError):
+        raise InvalidTokenError('Token has no valid lifetime')
+    if issued > now + CLOCK_SKEW or expires < now - CLOCK_SKEW:
+        raise InvalidTokenError('Token is not valid now')
+    return claims
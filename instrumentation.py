@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+
+"""instrumentation.py
+
+Per-request RPC and latency instrumentation for Conference Central.
+
+instrumentApp wraps a WSGI application (the endpoints API server or the
+webapp2 handlers in main.py). For every request it records the wall time,
+the API calls made per service, datastore entities read and written and
+the response size, keyed by endpoints method or handler path. Requests for
+names the application doesn't serve are counted together under OTHER, so
+clients can't grow the stats with made-up paths.
+
+Each instance keeps rolling latency samples in memory and periodically
+flushes a snapshot to memcache, where report() merges the snapshots of all
+instances. Instances that haven't flushed for SNAPSHOT_TTL are dropped from
+the list of instances.
+
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+from google.appengine.api import apiproxy_stub_map
+from google.appengine.api import memcache
+
+# holds {instance id: time of its last flush}
+MEMCACHE_INSTANCES_KEY = "INSTRUMENTATION_INSTANCES_V2"
+MEMCACHE_SNAPSHOT_PREFIX = "INSTRUMENTATION_"
+SNAPSHOT_TTL = 3600
+FLUSH_INTERVAL = 60
+LATENCY_SAMPLES = 200
+PERCENTILES = (50, 90, 99)
+SPI_PREFIX = '/_ah/spi/'
+# stats key of requests for unknown methods and paths
+OTHER = 'other'
+
+# datastore calls whose responses hold read entities or query results
+_READ_CALLS = ('Get', 'RunQuery', 'Next')
+# datastore calls whose requests hold written entities or deleted keys
+_WRITE_CALLS = ('Put', 'Delete')
+
+_instance_id = os.environ.get('INSTANCE_ID') or uuid.uuid4().hex
+_local = threading.local()
+_lock = threading.Lock()
+_stats = {}
+_last_flush = [time.time()]
+
+
+class Recorder(object):
+    """API calls made while handling one request."""
+
+    def __init__(self):
+        self.rpcs = {}
+        self.read = 0
+        self.written = 0
+
+
+def _countEntities(recorder, call, request, response):
+    """Add the datastore entities moved by one call to recorder."""
+    if call == 'Get':
+        recorder.read += sum(1 for e in response.entity_list()
+                             if e.has_entity())
+    elif call in ('RunQuery', 'Next'):
+        recorder.read += response.result_size()
+    elif call == 'Put':
+        recorder.written += request.entity_size()
+    elif call == 'Delete':
+        recorder.written += request.key_size()
+
+
+def _postCallHook(service, call, request, response, rpc=None, error=None):
+    """Count an API call against every recording active on this thread."""
+    for recorder in getattr(_local, 'recorders', ()):
+        recorder.rpcs[service] = recorder.rpcs.get(service, 0) + 1
+        if service == 'datastore_v3' and error is None and (
+                call in _READ_CALLS or call in _WRITE_CALLS):
+            _countEntities(recorder, call, request, response)
+
+
+def installRpcHook():
+    """Count the API calls made through the current API proxy.
+
+    Runs at import; call it again after replacing the proxy, as
+    testbed.activate() does.
+    """
+    apiproxy_stub_map.apiproxy.GetPostCallHooks().Append(
+        'instrumentation', _postCallHook)
+
+
+installRpcHook()
+
+
+@contextmanager
+def recording():
+    """Record the API calls made on this thread inside the block.
+
+    Yields the Recorder, whose counts are final once the block exits.
+    Recordings nest: a call counts towards every enclosing block.
+    """
+    recorder = Recorder()
+    if not hasattr(_local, 'recorders'):
+        _local.recorders = []
+    _local.recorders.append(recorder)
+    try:
+        yield recorder
+    finally:
+        _local.recorders.remove(recorder)
+
+
+def _newMethodStats():
+    """Return empty stats for one method."""
+    return {'calls': 0, 'rpcs': {}, 'read': 0, 'written': 0, 'bytes': 0,
+            'latencies': deque(maxlen=LATENCY_SAMPLES)}
+
+
+def _record(name, recorder, wall_ms, size):
+    """Add one finished request to the in-memory stats."""
+    with _lock:
+        stats = _stats.setdefault(name, _newMethodStats())
+        stats['calls'] += 1
+        for service, count in recorder.rpcs.items():
+            stats['rpcs'][service] = stats['rpcs'].get(service, 0) + count
+        stats['read'] += recorder.read
+        stats['written'] += recorder.written
+        stats['bytes'] += size
+        stats['latencies'].append(wall_ms)
+
+
+def _snapshot():
+    """Return a copy of the in-memory stats that memcache can pickle."""
+    with _lock:
+        return dict((name, dict(stats, rpcs=dict(stats['rpcs']),
+                                latencies=list(stats['latencies'])))
+                    for name, stats in _stats.items())
+
+
+def _updateInstances(client, update):
+    """Replace the instances dict with update(instances) using CAS; return
+    the dict stored, or None if every attempt lost to another writer."""
+    for _ in range(3):
+        instances = client.gets(MEMCACHE_INSTANCES_KEY)
+        if instances is None:
+            instances = update({})
+            if client.add(MEMCACHE_INSTANCES_KEY, instances,
+                          time=SNAPSHOT_TTL):
+                return instances
+            continue
+        instances = update(dict(instances))
+        if client.cas(MEMCACHE_INSTANCES_KEY, instances, time=SNAPSHOT_TTL):
+            return instances
+    return None
+
+
+def _registerInstance(client):
+    """Record that this instance has just flushed a snapshot."""
+    def touch(instances):
+        instances[_instance_id] = _last_flush[0]
+        return instances
+    _updateInstances(client, touch)
+
+
+def _liveInstances():
+    """Return the ids of instances that flushed within SNAPSHOT_TTL,
+    dropping the others from memcache."""
+    client = memcache.Client()
+    cutoff = time.time() - SNAPSHOT_TTL
+
+    def prune(instances):
+        return dict((i, seen) for i, seen in instances.items()
+                    if seen >= cutoff)
+    instances = _updateInstances(client, prune)
+    if instances is None:
+        # lost every CAS to flushing instances; leave pruning to the next
+        # report
+        instances = prune(client.get(MEMCACHE_INSTANCES_KEY) or {})
+    return list(instances)
+
+
+def flush():
+    """Write this instance's stats to memcache."""
+    _last_flush[0] = time.time()
+    client = memcache.Client()
+    client.set(MEMCACHE_SNAPSHOT_PREFIX + _instance_id, _snapshot(),
+               time=SNAPSHOT_TTL)
+    _registerInstance(client)
+
+
+def _methodName(environ):
+    """Return the endpoints method or handler path of a request."""
+    path = environ.get('PATH_INFO', '')
+    if path.startswith(SPI_PREFIX):
+        return path[len(SPI_PREFIX):]
+    return path
+
+
+def instrumentApp(app, names):
+    """Wrap a WSGI application so every request it serves is recorded.
+
+    Args:
+        app: the WSGI application
+        names: the endpoints methods ('ConferenceApi.getConference') or
+            handler paths app serves; other requests are recorded as OTHER
+    """
+    names = frozenset(names)
+
+    def instrumented(environ, start_response):
+        start = time.time()
+        body = []
+        try:
+            with recording() as recorder:
+                result = app(environ, start_response)
+                try:
+                    body = list(result)
+                finally:
+                    if hasattr(result, 'close'):
+                        result.close()
+        finally:
+            name = _methodName(environ)
+            _record(name if name in names else OTHER, recorder,
+                    (time.time() - start) * 1000,
+                    sum(len(chunk) for chunk in body))
+        if time.time() - _last_flush[0] > FLUSH_INTERVAL:
+            flush()
+        return body
+    return instrumented
+
+
+def _percentile(samples, pct):
+    """Return the pct percentile of sorted samples (nearest rank)."""
+    if not samples:
+        return None
+    rank = max(0, int(round(pct / 100.0 * len(samples))) - 1)
+    return samples[rank]
+
+
+def report():
+    """Merge the flushed snapshots of all instances, per method.
+
+    Returns:
+        dict mapping method name to its call count, average RPCs per
+        service, average entities read and written, average response
+        bytes and latency percentiles in milliseconds
+    """
+    flush()
+    snapshots = memcache.get_multi(
+        [MEMCACHE_SNAPSHOT_PREFIX + i for i in _liveInstances()]).values()
+
+    merged = {}
+    for snapshot in snapshots:
+        for name, stats in snapshot.items():
+            total = merged.setdefault(
+                name, dict(_newMethodStats(), latencies=[]))
+            total['calls'] += stats['calls']
+            for service, count in stats['rpcs'].items():
+                total['rpcs'][service] = (
+                    total['rpcs'].get(service, 0) + count)
+            total['read'] += stats['read']
+            total['written'] += stats['written']
+            total['bytes'] += stats['bytes']
+            total['latencies'].extend(stats['latencies'])
+
+    result = {}
+    for name, total in merged.items():
+        calls = float(total['calls'])
+        latencies = sorted(total['latencies'])
+        result[name] = {
+            'calls': total['calls'],
+            'rpcsPerCall': dict((service, count / calls)
+                                for service, count in total['rpcs'].items()),
+            'entitiesReadPerCall': total['read'] / calls,
+            'entitiesWrittenPerCall': total['written'] / calls,
+            'bytesPerCall': total['bytes'] / calls,
+            'latencyMs': dict(('p%d' % pct, _percentile(latencies, pct))
+                              for pct in PERCENTILES),
+        }
+    return result
@@ -12,10 +12,17 @@ created by wesc on 2014 may 24
 
 __author__ = 'wesc+api@google.com (Wesley Chun)'
 
+import json
+
 import webapp2
 from google.appengine.api import app_identity
 from google.appengine.api import mail
 from conference import ConferenceApi
+from confirmations import sendConfirmationDigests
+from instrumentation import instrumentApp
+from instrumentation import report
+from querycache import getStats as getQueryCacheStats
+from tieredcache import getStats as getTieredCacheStats
 
 class SetAnnouncementHandler(webapp2.RequestHandler):
     def get(self):
@@ -26,7 +33,8 @@ class SetAnnouncementHandler(webapp2.RequestHandler):
 
 class SendConfirmationEmailHandler(webapp2.RequestHandler):
     def post(self):
-        """Send email confirming Conference creation."""
+        """Send email confirming Conference creation; drains push tasks
+        queued before confirmations moved to the pull queue."""
         mail.send_mail(
             'noreply@%s.appspotmail.com' % (
                 app_identity.get_application_id()),     # from
@@ -38,6 +46,13 @@ class SendConfirmationEmailHandler(webapp2.RequestHandler):
         )
 
 
+class SendConfirmationDigestsHandler(webapp2.RequestHandler):
+    def get(self):
+        """Send queued confirmation emails as per-recipient digests."""
+        sendConfirmationDigests()
+        self.response.set_status(204)
+
+
 class SetFeaturedSpeakerHandler(webapp2.RequestHandler):
     def post(self):
         """Set Featured Speaker in Memcache."""
@@ -45,8 +60,104 @@ class SetFeaturedSpeakerHandler(webapp2.RequestHandler):
         self.response.set_status(204)
 
 
-app = webapp2.WSGIApplication([
+class BatchTaskHandler(webapp2.RequestHandler):
+    """Runs the first batch of a batch task when an admin visits it, and
+    every chained batch from the task queue."""
+    task = None
+
+    def get(self):
+        """Start the task (admin only)."""
+        self.task(self.request)
+        self.response.set_status(204)
+
+    def post(self):
+        """Run one chained batch."""
+        self.task(self.request)
+        self.response.set_status(204)
+
+
+class SetOrganizerNamesHandler(BatchTaskHandler):
+    """Copy organizer names onto Conferences."""
+    task = staticmethod(ConferenceApi._setOrganizerNames)
+
+
+class MigrateProfilesHandler(BatchTaskHandler):
+    """Move Profile lists into their own kinds."""
+    task = staticmethod(ConferenceApi._migrateProfiles)
+
+
+class CountWishlistHandler(webapp2.RequestHandler):
+    def post(self):
+        """Count a migrated wishlist towards session popularity."""
+        ConferenceApi._countMigratedWishlist(self.request)
+        self.response.set_status(204)
+
+
+class SyncNearlySoldOutHandler(webapp2.RequestHandler):
+    def post(self):
+        """Sync a conference's entry in the NearlySoldOut index."""
+        ConferenceApi._syncNearlySoldOutTask(self.request)
+        self.response.set_status(204)
+
+
+class BackfillNearlySoldOutHandler(BatchTaskHandler):
+    """List existing nearly sold out conferences."""
+    task = staticmethod(ConferenceApi._backfillNearlySoldOut)
+
+
+class StoreSpeakersHandler(BatchTaskHandler):
+    """Store missing speaker aggregates."""
+    task = staticmethod(ConferenceApi._storeSpeakerAggregates)
+
+
+class InstrumentationReportHandler(webapp2.RequestHandler):
+    def get(self):
+        """Report RPC counts and latencies per method (admin only)."""
+        self.response.headers['Content-Type'] = 'application/json'
+        self.response.write(json.dumps(report(), indent=2, sort_keys=True))
+
+
+class QueryCacheStatsHandler(webapp2.RequestHandler):
+    def get(self):
+        """Report queryConferences cache hits and misses (admin only)."""
+        hits, misses, generation = getQueryCacheStats()
+        self.response.headers['Content-Type'] = 'application/json'
+        self.response.write(json.dumps(
+            {'hits': hits, 'misses': misses, 'generation': generation},
+            indent=2, sort_keys=True))
+
+
+class CacheStatsHandler(webapp2.RequestHandler):
+    def get(self):
+        """Report per-tier hit counts and ratios of the two-tier caches
+        (admin only)."""
+        caches = {}
+        for name, counts in getTieredCacheStats():
+            reads = float(sum(counts.values())) or 1.0
+            caches[name] = {
+                'localHits': counts['local'],
+                'memcacheHits': counts['memcache'],
+                'misses': counts['miss'],
+                'localHitRatio': counts['local'] / reads,
+                'memcacheHitRatio': counts['memcache'] / reads}
+        self.response.headers['Content-Type'] = 'application/json'
+        self.response.write(json.dumps(caches, indent=2, sort_keys=True))
+
+
+routes = [
     ('/crons/set_announcement', SetAnnouncementHandler),
     ('/tasks/send_confirmation_email', SendConfirmationEmailHandler),
+    ('/crons/send_confirmation_emails', SendConfirmationDigestsHandler),
     ('/tasks/set_featured_speaker', SetFeaturedSpeakerHandler),
-], debug=True)
+    ('/tasks/set_organizer_names', SetOrganizerNamesHandler),
+    ('/tasks/migrate_profiles', MigrateProfilesHandler),
+    ('/tasks/count_wishlist', CountWishlistHandler),
+    ('/tasks/store_speakers', StoreSpeakersHandler),
+    ('/tasks/sync_nearly_sold_out', SyncNearlySoldOutHandler),
+    ('/tasks/backfill_nearly_sold_out', BackfillNearlySoldOutHandler),
+    ('/admin/instrumentation', InstrumentationReportHandler),
+    ('/admin/query_cache_stats', QueryCacheStatsHandler),
+    ('/admin/cache_stats', CacheStatsHandler),
+]
+app = webapp2.WSGIApplication(routes, debug=True)
+app = instrumentApp(app, [path for path, handler in routes])
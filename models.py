@@ -26,6 +26,8 @@ class ConflictException(endpoints.ServiceException):
 class StringMessage(messages.Message):
     """StringMessage -- outbound (single) string message"""
     data = messages.StringField(1, required=True)
+    etag = messages.StringField(2)
+    notModified = messages.BooleanField(3)
 
 
 class BooleanMessage(messages.Message):
@@ -38,8 +40,22 @@ class Profile(ndb.Model):
     displayName = ndb.StringProperty()
     mainEmail = ndb.StringProperty()
     teeShirtSize = ndb.StringProperty(default='NOT_SPECIFIED')
-    conferenceKeysToAttend = ndb.StringProperty(repeated=True)
-    sessionWishlistKeys = ndb.StringProperty(repeated=True)
+    # legacy lists, moved into Registration and WishlistEntry entities
+    conferenceKeysToAttend = ndb.StringProperty(repeated=True, indexed=False)
+    sessionWishlistKeys = ndb.StringProperty(repeated=True, indexed=False)
+
+
+class Registration(ndb.Model):
+    """Registration -- Profile child; its id is the websafe Conference key
+    the user registered for"""
+
+
+class WishlistEntry(ndb.Model):
+    """WishlistEntry -- Profile child; its id is the websafe key of a
+    Session in the user's wishlist"""
+    websafeConferenceKey = ndb.StringProperty(required=True)
+    # False until a migrated entry is counted in the popularity shards
+    counted = ndb.BooleanProperty(default=True, indexed=False)
 
 
 class ProfileMiniForm(messages.Message):
@@ -88,6 +104,28 @@ class Conference(ndb.Model):
     endDate         = ndb.DateProperty()
     maxAttendees    = ndb.IntegerProperty()
     seatsAvailable  = ndb.IntegerProperty()
+    seatPools       = ndb.IntegerProperty(indexed=False)
+    organizerDisplayName = ndb.StringProperty(indexed=False)
+
+
+class SeatPool(ndb.Model):
+    """SeatPool -- one shard of a Conference's available seats"""
+    websafeConferenceKey = ndb.StringProperty(required=True)
+    seatsAvailable       = ndb.IntegerProperty(default=0, indexed=False)
+
+
+class NearlySoldOutEntry(ndb.Model):
+    """NearlySoldOutEntry -- a Conference listed in the NearlySoldOut index"""
+    websafeConferenceKey = ndb.StringProperty()
+    name                 = ndb.StringProperty()
+
+
+class NearlySoldOut(ndb.Model):
+    """NearlySoldOut -- index of Conferences with 1 to 5 seats left"""
+    conferences = ndb.LocalStructuredProperty(NearlySoldOutEntry,
+                                              repeated=True)
+    # incremented on every write, to order announcement cache updates
+    version = ndb.IntegerProperty(default=0, indexed=False)
 
 
 class ConferenceForm(messages.Message):
@@ -104,11 +142,31 @@ class ConferenceForm(messages.Message):
     endDate         = messages.StringField(10) #DateTimeField()
     websafeKey      = messages.StringField(11)
     organizerDisplayName = messages.StringField(12)
+    etag            = messages.StringField(13)
+    notModified     = messages.BooleanField(14)
 
 
 class ConferenceForms(messages.Message):
     """ConferenceForms -- multiple Conference outbound form message"""
     items = messages.MessageField(ConferenceForm, 1, repeated=True)
+    nextPageToken = messages.StringField(2)
+
+
+class ConferenceSummaryForm(messages.Message):
+    """ConferenceSummaryForm -- Conference outbound list view message"""
+    name            = messages.StringField(1)
+    city            = messages.StringField(2)
+    startDate       = messages.StringField(3)
+    endDate         = messages.StringField(4)
+    seatsAvailable  = messages.IntegerField(5)
+    websafeKey      = messages.StringField(6)
+
+
+class ConferenceSummaryForms(messages.Message):
+    """ConferenceSummaryForms -- multiple ConferenceSummaryForm outbound
+    message"""
+    items = messages.MessageField(ConferenceSummaryForm, 1, repeated=True)
+    nextPageToken = messages.StringField(2)
 
 
 class ConferenceQueryForm(messages.Message):
@@ -121,6 +179,9 @@ class ConferenceQueryForm(messages.Message):
 class ConferenceQueryForms(messages.Message):
     """ConferenceQueryForms -- multiple ConferenceQueryForm inbound form message"""
     filters = messages.MessageField(ConferenceQueryForm, 1, repeated=True)
+    pageSize = messages.IntegerField(2)
+    pageToken = messages.StringField(3)
+    fields = messages.StringField(4)
 
 
 class Speaker(ndb.Model):
@@ -171,6 +232,22 @@ class SessionForm(messages.Message):
 class SessionForms(messages.Message):
     """SessionForms -- multiple Session outbound form message"""
     sessions = messages.MessageField(SessionForm, 1, repeated=True)
+    etag = messages.StringField(2)
+    notModified = messages.BooleanField(3)
+
+
+class SessionSummaryForm(messages.Message):
+    """SessionSummaryForm -- Session outbound list view message"""
+    name            = messages.StringField(1)
+    typeOfSession   = messages.EnumField('TypeOfSession', 2)
+    date            = messages.StringField(3)
+    startTime       = messages.StringField(4)
+    websafeKey      = messages.StringField(5)
+
+
+class SessionSummaryForms(messages.Message):
+    """SessionSummaryForms -- multiple SessionSummaryForm outbound message"""
+    sessions = messages.MessageField(SessionSummaryForm, 1, repeated=True)
 
 
 class SessionMiniHardForm(messages.Message):
@@ -179,6 +256,37 @@ class SessionMiniHardForm(messages.Message):
     beforeTime = messages.StringField(2)
 
 
+class SessionQueryForm(messages.Message):
+    """SessionQueryForm -- Session query inbound form message"""
+    field = messages.StringField(1)
+    operator = messages.StringField(2)
+    value = messages.StringField(3)
+
+
+class SessionQueryForms(messages.Message):
+    """SessionQueryForms -- multiple SessionQueryForm inbound form message"""
+    filters = messages.MessageField(SessionQueryForm, 1, repeated=True)
+
+
+class SpeakerSessions(ndb.Model):
+    """SpeakerSessions -- names of one speaker's sessions in a Conference"""
+    speakerKey      = ndb.StringProperty()
+    sessionNames    = ndb.StringProperty(repeated=True)
+
+
+class ConferenceSpeakers(ndb.Model):
+    """ConferenceSpeakers -- speaker -> sessions aggregate of a Conference"""
+    speakers = ndb.LocalStructuredProperty(SpeakerSessions, repeated=True)
+    version = ndb.IntegerProperty(default=0, indexed=False)
+
+
+class SessionPopularityShard(ndb.Model):
+    """SessionPopularityShard -- one shard of a session's wishlist counter"""
+    websafeSessionKey    = ndb.StringProperty(required=True)
+    websafeConferenceKey = ndb.StringProperty(required=True)
+    count                = ndb.IntegerProperty(default=0, indexed=False)
+
+
 class TypeOfSession(messages.Enum):
     """TypeOfSession -- session type enumeration value"""
     NOT_SPECIFIED = 1
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+"""querycache.py
+
+Memcache result cache for conference queries.
+
+Results are stored under a key made of a global conference generation and
+a hash of the canonical (sorted) filter set. Any write that can change a
+query result bumps the generation, which makes every cached result
+unreachable at once; old entries simply expire. The generation is a
+formcache version counter.
+
+Conference queries are eventually consistent, so a query run right after
+a bump may not see the write yet. Results built within CONSISTENCY_WINDOW
+of the last bump are returned but not cached.
+
+Hits and misses are counted in instance memory and added to memcache
+counters in batches, where getStats() reads the totals of all instances.
+
+"""
+
+import hashlib
+import json
+import threading
+import time
+
+from google.appengine.api import memcache
+from protorpc import protojson
+
+from formcache import bumpVersion
+from formcache import getVersion
+
+QUERY_GENERATION = "CONFERENCE_QUERIES"
+MEMCACHE_BUMPED_KEY = "CONFERENCE_QUERIES_BUMPED"
+MEMCACHE_RESULT_PREFIX = "CONFERENCE_QUERY_"
+MEMCACHE_STATS_PREFIX = "CONFERENCE_QUERY_STATS_"
+RESULT_CACHE_TTL = 600
+CONSISTENCY_WINDOW = 5
+STATS_FLUSH_INTERVAL = 60
+
+_lock = threading.Lock()
+_counts = {'hits': 0, 'misses': 0}
+_last_flush = [time.time()]
+
+
+def bumpGeneration():
+    """Outdate all cached query results; return the new generation."""
+    generation = bumpVersion(QUERY_GENERATION)
+    memcache.set(MEMCACHE_BUMPED_KEY, time.time())
+    return generation
+
+
+def resultKey(generation, filters, page):
+    """Return the memcache key of a query result.
+
+    Args:
+        generation: conference generation the result was built under
+        filters: filter dicts with field, operator and value keys, as
+            returned by ConferenceApi._formatFilters
+        page: hashable description of the requested page
+    """
+    canonical = json.dumps([
+        sorted((f['field'], f['operator'], f['value']) for f in filters),
+        list(page),
+    ])
+    return '%s%s_%s' % (MEMCACHE_RESULT_PREFIX, generation,
+                        hashlib.sha1(canonical).hexdigest())
+
+
+def _count(outcome):
+    """Count a hit or miss, flushing the counts now and then."""
+    with _lock:
+        _counts[outcome] += 1
+    if time.time() - _last_flush[0] > STATS_FLUSH_INTERVAL:
+        flushStats()
+
+
+def getResult(filters, page, message_type, build):
+    """Return the cached result for a query, building and caching it on a
+    miss.
+
+    Args:
+        filters: formatted filters of the query
+        page: tuple describing the requested page (size, token)
+        message_type: ProtoRPC message class of the result
+        build: callable returning the freshly built result
+    Returns:
+        result: instance of message_type
+    """
+    client = memcache.Client()
+    # Capture the generation before building, so a result built from data
+    # that a concurrent writer changes is stored under the old generation.
+    generation = getVersion(QUERY_GENERATION)
+    key = None
+    if generation is not None:
+        key = resultKey(generation, filters, page)
+        data = client.get(key)
+        if data is not None:
+            _count('hits')
+            return protojson.decode_message(message_type, data)
+
+    _count('misses')
+    started = time.time()
+    result = build()
+    if key is not None:
+        bumped = client.get(MEMCACHE_BUMPED_KEY)
+        if bumped is None or started - bumped > CONSISTENCY_WINDOW:
+            client.set(key, protojson.encode_message(result),
+                       time=RESULT_CACHE_TTL)
+    return result
+
+
+def flushStats():
+    """Add this instance's hit and miss counts to the memcache totals."""
+    _last_flush[0] = time.time()
+    with _lock:
+        deltas = dict((outcome, count) for outcome, count in _counts.items()
+                      if count)
+        for outcome in deltas:
+            _counts[outcome] = 0
+    if deltas:
+        memcache.offset_multi(deltas, key_prefix=MEMCACHE_STATS_PREFIX,
+                              initial_value=0)
+
+
+def getStats():
+    """Return (hits, misses, generation) of the query result cache."""
+    flushStats()
+    stats = memcache.get_multi(['hits', 'misses'],
+                               key_prefix=MEMCACHE_STATS_PREFIX)
+    return (stats.get('hits', 0), stats.get('misses', 0),
+            getVersion(QUERY_GENERATION))
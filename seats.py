@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+
+"""seats.py
+
+Seat accounting for Conference Central. A Conference's available seats are
+split across several SeatPool root entities, so registrations for the same
+conference take seats from different entity groups and commit in parallel.
+Every pool is decremented transactionally and never below zero, so the
+conference as a whole can never be oversold.
+
+"""
+
+import random
+
+from google.appengine.ext import ndb
+
+from models import Conference
+from models import SeatPool
+
+NUM_SEAT_POOLS = 10
+
+
+def _poolId(wsck, index):
+    """Return the datastore id of a conference's seat pool."""
+    return '%s-%d' % (wsck, index)
+
+
+def poolKeys(conf):
+    """Return the keys of all seat pools of a conference."""
+    wsck = conf.key.urlsafe()
+    return [ndb.Key(SeatPool, _poolId(wsck, i))
+            for i in range(conf.seatPools or 0)]
+
+
+def sumSeatPools(conf, pools):
+    """Return seats available for conf from already fetched pools.
+
+    Args:
+        conf: Conference entity
+        pools: dict mapping SeatPool keys to SeatPool entities; may hold
+            pools of other conferences or pools that are no longer used
+    """
+    keys = poolKeys(conf)
+    if not keys:
+        return conf.seatsAvailable
+    return sum(pools[k].seatsAvailable for k in keys if pools.get(k))
+
+
+def buildSeatPools(conf, seats):
+    """Split seats across new SeatPool entities for a conference.
+
+    Sets conf.seatPools to the number of pools built. Neither the pools nor
+    the conference are written; the caller puts them, in the same
+    transaction when replacing the pools of an existing conference.
+
+    Args:
+        conf: Conference entity with a complete key
+        seats: total number of seats to distribute
+    Returns:
+        pools: list of SeatPool entities
+    """
+    wsck = conf.key.urlsafe()
+    num_pools = max(1, min(NUM_SEAT_POOLS, seats))
+    share, extra = divmod(seats, num_pools)
+    conf.seatPools = num_pools
+    return [SeatPool(id=_poolId(wsck, i),
+                     websafeConferenceKey=wsck,
+                     seatsAvailable=share + (1 if i < extra else 0))
+            for i in range(num_pools)]
+
+
+@ndb.transactional(xg=True)
+def _splitLegacySeats(c_key):
+    """Create seat pools for a conference stored before pools existed."""
+    conf = c_key.get()
+    if not conf.seatPools:
+        pools = buildSeatPools(conf, conf.seatsAvailable or 0)
+        ndb.put_multi([conf] + pools)
+    return conf
+
+
+def ensureSeatPools(conf):
+    """Return conf, creating its seat pools first if it has none."""
+    if conf.seatPools:
+        return conf
+    return _splitLegacySeats(conf.key)
+
+
+def getSeatsAvailable(conf):
+    """Return the number of seats available for a conference."""
+    return getSeatsAvailableMulti([conf])[0]
+
+
+def getSeatsAvailableMulti(confs):
+    """Return seats available for each conference, in the same order.
+
+    All pools of all conferences are read with a single get_multi.
+    Conferences without pools report their stored seatsAvailable.
+    """
+    return getSeatsAvailableMultiAsync(confs).get_result()
+
+
+@ndb.tasklet
+def getSeatsAvailableMultiAsync(confs):
+    """Async version of getSeatsAvailableMulti; issues at most one RPC."""
+    # the same conference may appear more than once; read its pools once
+    unique_keys = list(set(k for conf in confs for k in poolKeys(conf)))
+    pools = {}
+    if unique_keys:
+        for pool in (yield ndb.get_multi_async(unique_keys)):
+            if pool:
+                pools[pool.key] = pool
+    raise ndb.Return([sumSeatPools(conf, pools) for conf in confs])
+
+
+def candidatePoolKeys(conf):
+    """Return keys of pools that appeared to have seats, in random order.
+
+    The pools are read outside any transaction, so the result is only a
+    hint; takeSeat re-checks the pool transactionally.
+    """
+    keys = poolKeys(conf)
+    candidates = [k for k, p in zip(keys, ndb.get_multi(keys))
+                  if p and p.seatsAvailable > 0]
+    random.shuffle(candidates)
+    return candidates
+
+
+def takeSeat(pool_key):
+    """Take one seat from a pool; must run inside a transaction.
+
+    Returns:
+        pool: the modified SeatPool to put, or None if it has no seats left
+    """
+    pool = pool_key.get()
+    if not pool or pool.seatsAvailable <= 0:
+        return None
+    pool.seatsAvailable -= 1
+    return pool
+
+
+def returnSeat(conf):
+    """Give one seat back to a random pool; must run inside a transaction.
+
+    Returns:
+        pool: the modified SeatPool to put
+    """
+    pool = random.choice(poolKeys(conf)).get()
+    pool.seatsAvailable += 1
+    return pool
+
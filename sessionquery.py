@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+"""sessionquery.py
+
+Query planner for Session searches within a Conference.
+
+Datastore queries allow inequality filters on only one property, and "!="
+expands into an OR of sub-queries. The planner therefore sends the
+conference filter plus the single most selective filter that existing
+indexes can serve to the datastore, and applies every other filter in
+memory to the (already small) result set.
+
+"""
+
+import operator
+from datetime import datetime
+
+import endpoints
+from google.appengine.ext import ndb
+
+from models import Session
+from models import TypeOfSession
+from utils import getSeconds
+
+SESSION_FIELDS = {
+    'TYPE': 'typeOfSession',
+    'START_TIME': 'startTime',
+    'DATE': 'date',
+    'SPEAKER': 'speakerKeys',
+    'DURATION': 'duration',
+}
+
+SESSION_OPERATORS = {
+    'EQ':   '=',
+    'GT':   '>',
+    'GTEQ': '>=',
+    'LT':   '<',
+    'LTEQ': '<=',
+    'NE':   '!=',
+}
+
+# Fields that only make sense compared for (in)equality
+EQUALITY_ONLY_FIELDS = ('typeOfSession', 'speakerKeys', 'duration')
+
+# Fields with a (websafeConferenceKey, field) composite index, so a range
+# filter on them can run in the datastore
+RANGE_INDEXED_FIELDS = ('startTime', 'date')
+
+# Rough selectivity of a datastore filter: lower keeps fewer sessions.
+# Equality filters are served by merging built-in single property indexes.
+EQUALITY_SELECTIVITY = {
+    'speakerKeys': 1,
+    'date': 2,
+    'startTime': 2,
+    'duration': 3,
+    'typeOfSession': 4,
+}
+RANGE_SELECTIVITY = 5
+
+_COMPARE = {
+    '=':  operator.eq,
+    '>':  operator.gt,
+    '>=': operator.ge,
+    '<':  operator.lt,
+    '<=': operator.le,
+    '!=': operator.ne,
+}
+
+
+def _parseValue(field, value):
+    """Convert a filter value string to the type stored on Session."""
+    if value is None:
+        raise endpoints.BadRequestException(
+            "Filter on '%s' has no value." % field)
+    try:
+        if field == 'startTime':
+            return getSeconds(value)
+        if field == 'date':
+            return datetime.strptime(value[:10], "%Y-%m-%d").date()
+    except (ValueError, TypeError):
+        raise endpoints.BadRequestException(
+            "Invalid value for filter on '%s'." % field)
+    if field == 'typeOfSession' and value not in TypeOfSession.names():
+        raise endpoints.BadRequestException(
+            "Invalid session type: %s" % value)
+    return value
+
+
+def parseFilters(filters):
+    """Parse, check validity and format user supplied session filters.
+
+    Args:
+        filters: list of SessionQueryForm messages
+    Returns:
+        parsed: list of dicts with field, operator and value keys, the
+            value converted to the type stored on Session
+    """
+    parsed = []
+    for f in filters:
+        try:
+            field = SESSION_FIELDS[f.field]
+            op = SESSION_OPERATORS[f.operator]
+        except KeyError:
+            raise endpoints.BadRequestException(
+                "Filter contains invalid field or operator.")
+        if field in EQUALITY_ONLY_FIELDS and op not in ('=', '!='):
+            raise endpoints.BadRequestException(
+                "Only EQ and NE filters are allowed on '%s'." % field)
+        parsed.append({'field': field,
+                       'operator': op,
+                       'value': _parseValue(field, f.value)})
+    return parsed
+
+
+def _cost(filtr):
+    """Return the estimated selectivity of running filtr in the datastore,
+    or None if the indexes can't serve it."""
+    if filtr['operator'] == '=':
+        return EQUALITY_SELECTIVITY[filtr['field']]
+    if filtr['operator'] != '!=' and filtr['field'] in RANGE_INDEXED_FIELDS:
+        return RANGE_SELECTIVITY
+    return None
+
+
+def planQuery(wsck, filters):
+    """Split parsed filters into a datastore query and in-memory filters.
+
+    Returns:
+        (query, post_filters): an ndb query on the conference's sessions
+            using the most selective indexable filter, and the filters left
+            to apply in memory
+    """
+    q = Session.query(Session.websafeConferenceKey == wsck)
+    candidates = [f for f in filters if _cost(f) is not None]
+    if not candidates:
+        return q, list(filters)
+
+    chosen = min(candidates, key=_cost)
+    q = q.filter(ndb.query.FilterNode(
+        chosen['field'], chosen['operator'], chosen['value']))
+    return q, [f for f in filters if f is not chosen]
+
+
+def _matches(sess, filtr):
+    """Return True if a Session passes an in-memory filter, with the same
+    semantics the datastore would apply."""
+    value = getattr(sess, filtr['field'])
+    compare = _COMPARE[filtr['operator']]
+    if filtr['field'] == 'speakerKeys':
+        found = filtr['value'] in value
+        return found if filtr['operator'] == '=' else not found
+    # entities without a value are never matched by the datastore
+    if value is None:
+        return False
+    return compare(value, filtr['value'])
+
+
+def runQuery(wsck, filters):
+    """Return the Sessions of a conference matching all parsed filters,
+    ordered by start time."""
+    q, post_filters = planQuery(wsck, filters)
+    if post_filters:
+        sessions = [s for s in q.fetch()
+                    if all(_matches(s, f) for f in post_filters)]
+    else:
+        # Nothing left to check in memory: fetch keys only, so entities
+        # are served from ndb's cache where possible.
+        sessions = [s for s in ndb.get_multi(q.fetch(keys_only=True)) if s]
+    sessions.sort(key=lambda s: s.startTime)
+    return sessions
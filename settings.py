@@ -16,3 +16,7 @@ WEB_CLIENT_ID = '809495181098-9kbg46r0g8vg09i25b1d9vns4am75svd.apps.googleuserco
 ANDROID_CLIENT_ID = 'replace with Android client ID'
 IOS_CLIENT_ID = 'replace with iOS client ID'
 ANDROID_AUDIENCE = WEB_CLIENT_ID
+
+# Verify Google ID tokens locally against Google's cached signing keys
+# instead of calling the tokeninfo endpoint (see utils.getUserId)
+VERIFY_ID_TOKENS_LOCALLY = False
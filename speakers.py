@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+"""speakers.py
+
+Per-Conference speaker aggregate for Conference Central. A ConferenceSpeakers
+entity, a child of its Conference, lists the sessions of every speaker. It
+is updated in the same transaction that stores new sessions, so the
+featured speaker is read from one entity instead of rescanning every
+Session of the conference. Aggregates of conferences whose sessions predate
+it are only written by the storeSpeakers backfill, never on a read.
+
+"""
+
+from google.appengine.ext import ndb
+
+from models import ConferenceSpeakers
+from models import Session
+from models import SpeakerSessions
+
+SPEAKERS_ID = 'speakers'
+
+
+def speakersKey(c_key):
+    """Return the key of a conference's ConferenceSpeakers aggregate."""
+    return ndb.Key(ConferenceSpeakers, SPEAKERS_ID, parent=c_key)
+
+
+def addSessions(tally, sessions):
+    """Count sessions towards their speakers in the aggregate."""
+    by_speaker = dict((s.speakerKey, s) for s in tally.speakers)
+    for sess in sessions:
+        for speaker_key in sess.speakerKeys:
+            if speaker_key not in by_speaker:
+                by_speaker[speaker_key] = SpeakerSessions(
+                    speakerKey=speaker_key)
+                tally.speakers.append(by_speaker[speaker_key])
+            by_speaker[speaker_key].sessionNames.append(sess.name)
+
+
+@ndb.tasklet
+def _buildSpeakersAsync(c_key):
+    """Build the aggregate from an ancestor query over the sessions."""
+    tally = ConferenceSpeakers(key=speakersKey(c_key))
+    addSessions(tally, (yield Session.query(ancestor=c_key).fetch_async()))
+    raise ndb.Return(tally)
+
+
+@ndb.transactional_tasklet
+def addSessionsAsync(c_key, sessions):
+    """Store new sessions and count them in the aggregate, atomically;
+    return the aggregate's new version.
+
+    A conference whose sessions predate the aggregate gets it built first.
+    """
+    tally = yield speakersKey(c_key).get_async()
+    if tally is None:
+        tally = yield _buildSpeakersAsync(c_key)
+    addSessions(tally, sessions)
+    tally.version += 1
+    yield ndb.put_multi_async(list(sessions) + [tally])
+    raise ndb.Return(tally.version)
+
+
+def getSpeakers(c_key):
+    """Return the aggregate of a conference.
+
+    Read only: the aggregate of a conference whose sessions predate it is
+    built in memory but not stored; storeSpeakers backfills it.
+    """
+    tally = speakersKey(c_key).get()
+    if tally is None:
+        tally = _buildSpeakersAsync(c_key).get_result()
+    return tally
+
+
+@ndb.transactional
+def storeSpeakers(c_key):
+    """Build and store the aggregate of an existing conference that has
+    none; return True if it was stored."""
+    if speakersKey(c_key).get() is not None or c_key.get() is None:
+        return False
+    _buildSpeakersAsync(c_key).get_result().put()
+    return True
+
+
+def featuredSpeaker(tally):
+    """Return the SpeakerSessions with the most sessions, or None when no
+    speaker has more than one session in the conference."""
+    featured = None
+    for speaker in tally.speakers:
+        if len(speaker.sessionNames) > 1 and (featured is None or
+                len(speaker.sessionNames) > len(featured.sessionNames)):
+            featured = speaker
+    return featured
@@ -346,13 +346,42 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
     $scope.pagination = $scope.pagination || {};
     $scope.pagination.currentPage = 0;
     $scope.pagination.pageSize = 20;
+
     /**
-     * Returns the number of the pages in the pagination.
+     * Holds the token the server returned for fetching the next page, if any.
+     * @type {string}
+     */
+    $scope.pagination.nextPageToken = null;
+
+    /**
+     * Holds the token of the page being fetched, so that repeated clicks don't fetch it twice.
+     * @type {string}
+     */
+    $scope.pagination.pendingPageToken = null;
+
+    /**
+     * Returns the number of the pages in the pagination, counting one page not fetched yet
+     * when the server reported that more results are available.
      *
      * @returns {number}
      */
     $scope.pagination.numberOfPages = function () {
-        return Math.ceil($scope.conferences.length / $scope.pagination.pageSize);
+        var loaded = Math.ceil($scope.conferences.length / $scope.pagination.pageSize);
+        return $scope.pagination.nextPageToken ? loaded + 1 : loaded;
+    };
+
+    /**
+     * Moves to the given page, fetching it from the server first if it has not been loaded yet.
+     *
+     * @param page the zero-based page number.
+     */
+    $scope.pagination.goToPage = function (page) {
+        if (page * $scope.pagination.pageSize >= $scope.conferences.length &&
+            $scope.pagination.nextPageToken &&
+            $scope.pagination.nextPageToken !== $scope.pagination.pendingPageToken) {
+            $scope.queryConferences($scope.pagination.nextPageToken);
+        }
+        $scope.pagination.currentPage = page;
     };
 
     /**
@@ -411,24 +440,67 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
     /**
      * Query the conferences depending on the tab currently selected.
      *
+     * @param pageToken the token of the page to append; starts a new query when omitted.
      */
-    $scope.queryConferences = function () {
+    $scope.queryConferences = function (pageToken) {
         $scope.submitted = false;
+        if (!pageToken) {
+            $scope.conferences = [];
+            $scope.pagination.currentPage = 0;
+            $scope.pagination.nextPageToken = null;
+        }
+        $scope.pagination.pendingPageToken = pageToken || null;
         if ($scope.selectedTab == 'ALL') {
-            $scope.queryConferencesAll();
+            $scope.queryConferencesAll(pageToken);
         } else if ($scope.selectedTab == 'YOU_HAVE_CREATED') {
-            $scope.getConferencesCreated();
+            $scope.getConferencesCreated(pageToken);
         } else if ($scope.selectedTab == 'YOU_WILL_ATTEND') {
             $scope.getConferencesAttend();
         }
     };
 
+    /**
+     * Marks the fetch of a page as finished.
+     *
+     * @param pageToken the token of the fetched page, if any.
+     * @returns {boolean} false if a newer query has started since, so the page must be dropped.
+     */
+    $scope.pagination.finishPage = function (pageToken) {
+        if ((pageToken || null) !== $scope.pagination.pendingPageToken) {
+            return false;
+        }
+        $scope.pagination.pendingPageToken = null;
+        return true;
+    };
+
+    /**
+     * Appends a page of conferences returned by the server and remembers the next page token.
+     *
+     * @param resp the response of a paged conference query.
+     * @param pageToken the token the page was fetched with, if any.
+     */
+    $scope.appendConferencesPage = function (resp, pageToken) {
+        if (!$scope.pagination.finishPage(pageToken)) {
+            return;
+        }
+        angular.forEach(resp.items, function (conference) {
+            $scope.conferences.push(conference);
+        });
+        $scope.pagination.nextPageToken = resp.nextPageToken || null;
+    };
+
     /**
      * Invokes the conference.queryConferences API.
+     *
+     * @param pageToken the token of the page to fetch, if any.
      */
-    $scope.queryConferencesAll = function () {
+    $scope.queryConferencesAll = function (pageToken) {
         var sendFilters = {
-            filters: []
+            filters: [],
+            pageSize: $scope.pagination.pageSize
+        }
+        if (pageToken) {
+            sendFilters.pageToken = pageToken;
         }
         for (var i = 0; i < $scope.filters.length; i++) {
             var filter = $scope.filters[i];
@@ -451,6 +523,7 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
                         $scope.messages = 'Failed to query conferences : ' + errorMessage;
                         $scope.alertStatus = 'warning';
                         $log.error($scope.messages + ' filters : ' + JSON.stringify(sendFilters));
+                        $scope.pagination.finishPage(pageToken);
                     } else {
                         // The request has succeeded.
                         $scope.submitted = false;
@@ -458,10 +531,7 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
                         $scope.alertStatus = 'success';
                         $log.info($scope.messages);
 
-                        $scope.conferences = [];
-                        angular.forEach(resp.items, function (conference) {
-                            $scope.conferences.push(conference);
-                        });
+                        $scope.appendConferencesPage(resp, pageToken);
                     }
                     $scope.submitted = true;
                 });
@@ -470,10 +540,18 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
 
     /**
      * Invokes the conference.getConferencesCreated method.
+     *
+     * @param pageToken the token of the page to fetch, if any.
      */
-    $scope.getConferencesCreated = function () {
+    $scope.getConferencesCreated = function (pageToken) {
+        var params = {
+            pageSize: $scope.pagination.pageSize
+        }
+        if (pageToken) {
+            params.pageToken = pageToken;
+        }
         $scope.loading = true;
-        gapi.client.conference.getConferencesCreated().
+        gapi.client.conference.getConferencesCreated(params).
             execute(function (resp) {
                 $scope.$apply(function () {
                     $scope.loading = false;
@@ -483,6 +561,7 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
                         $scope.messages = 'Failed to query the conferences created : ' + errorMessage;
                         $scope.alertStatus = 'warning';
                         $log.error($scope.messages);
+                        $scope.pagination.finishPage(pageToken);
 
                         if (resp.code && resp.code == HTTP_ERRORS.UNAUTHORIZED) {
                             oauth2Provider.showLoginModal();
@@ -495,10 +574,7 @@ conferenceApp.controllers.controller('ShowConferenceCtrl', function ($scope, $lo
                         $scope.alertStatus = 'success';
                         $log.info($scope.messages);
 
-                        $scope.conferences = [];
-                        angular.forEach(resp.items, function (conference) {
-                            $scope.conferences.push(conference);
-                        });
+                        $scope.appendConferencesPage(resp, pageToken);
                     }
                     $scope.submitted = true;
                 });
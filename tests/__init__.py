@@ -0,0 +1,16 @@
+"""Tests for Conference Central.
+
+Run from the project root with the App Engine SDK on the path:
+
+    PYTHONPATH=$GAE_SDK python -m unittest discover -s tests -t .
+
+"""
+
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import dev_appserver
+dev_appserver.fix_sys_path()
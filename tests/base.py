@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+"""base.py
+
+Shared setup for tests running against the App Engine testbed stubs.
+
+"""
+
+import os
+import unittest
+
+from google.appengine.datastore import datastore_stub_util
+from google.appengine.ext import ndb
+from google.appengine.ext import testbed
+
+from instrumentation import installRpcHook
+from tests import ROOT
+
+AUTH_DOMAIN = 'example.com'
+
+
+class AppEngineTestCase(unittest.TestCase):
+    """Activates fresh datastore, memcache, task queue, user and urlfetch
+    stubs for every test. Queries are strongly consistent and ndb's
+    caches are off, so RPC counts are deterministic."""
+
+    def setUp(self):
+        self.testbed = testbed.Testbed()
+        self.testbed.activate()
+        policy = datastore_stub_util.PseudoRandomHRConsistencyPolicy(
+            probability=1)
+        self.testbed.init_datastore_v3_stub(consistency_policy=policy)
+        self.testbed.init_memcache_stub()
+        # queue.yaml defines the confirmation-emails pull queue
+        self.testbed.init_taskqueue_stub(root_path=ROOT)
+        self.testbed.init_user_stub()
+        self.testbed.init_urlfetch_stub()
+        context = ndb.get_context()
+        context.set_cache_policy(False)
+        context.set_memcache_policy(False)
+        context.clear_cache()
+        # testbed.activate() replaced the API proxy the hook was added to
+        installRpcHook()
+
+    def tearDown(self):
+        self.testbed.deactivate()
+        os.environ.pop('ENDPOINTS_AUTH_EMAIL', None)
+        os.environ.pop('ENDPOINTS_AUTH_DOMAIN', None)
+
+    def login(self, email):
+        """Make endpoints.get_current_user() return the user with email."""
+        os.environ['ENDPOINTS_AUTH_EMAIL'] = email
+        os.environ['ENDPOINTS_AUTH_DOMAIN'] = AUTH_DOMAIN
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+"""test_conference_lists.py
+
+RPC counts of the conference list endpoints, as recorded by the
+instrumentation hook.
+
+"""
+
+from datetime import date
+
+from google.appengine.ext import ndb
+from protorpc import remote
+
+from conference import CONF_BY_ORGANIZER_GET
+from conference import CONF_PAGE_REQUEST
+from conference import ConferenceApi
+from conference import LIST_GET_REQUEST
+from instrumentation import recording
+from models import Conference
+from models import ConferenceQueryForm
+from models import ConferenceQueryForms
+from models import Profile
+from models import Registration
+from seats import buildSeatPools
+from tests.base import AppEngineTestCase
+
+EMAIL = 'organizer@example.com'
+NUM_CONFERENCES = 3
+
+
+class ConferenceListRpcTest(AppEngineTestCase):
+
+    def setUp(self):
+        super(ConferenceListRpcTest, self).setUp()
+        self.api = ConferenceApi()
+        self.api.initialize_request_state(
+            remote.HttpRequestState(headers={}))
+        self.p_key = ndb.Key(Profile, EMAIL)
+        Profile(key=self.p_key, displayName='Organizer', mainEmail=EMAIL,
+                teeShirtSize='NOT_SPECIFIED').put()
+        self.confs = []
+        for i in range(NUM_CONFERENCES):
+            conf = Conference(
+                key=ndb.Key(Conference, i + 1, parent=self.p_key),
+                name='Conference %d' % i, organizerUserId=EMAIL,
+                organizerDisplayName='Organizer', city='London',
+                topics=['Web Technologies'], startDate=date(2026, 6, 1),
+                month=6, endDate=date(2026, 6, 2), maxAttendees=20,
+                seatsAvailable=20)
+            ndb.put_multi([conf] + buildSeatPools(conf, 20))
+            self.confs.append(conf)
+        self.login(EMAIL)
+
+    def _page(self):
+        return CONF_PAGE_REQUEST.combined_message_class()
+
+    def _datastoreRpcs(self, method, request):
+        """Call an endpoint method; return (response, datastore RPCs)."""
+        with recording() as recorder:
+            response = method(request)
+        return response, recorder.rpcs.get('datastore_v3', 0)
+
+    def testListConferencesCountsQueryAndPools(self):
+        # one query for the page and one batch get for all seat pools
+        result = self.api._listConferences(
+            Conference.query(ancestor=self.p_key), self._page())
+        self.assertEqual(NUM_CONFERENCES, len(result.forms.items))
+        self.assertEqual({'datastore_v3': 2}, result.rpcs)
+
+    def testListConferencesCountsExpandedInequality(self):
+        # "!=" runs as two datastore queries, merged in memory
+        inequality, filters = self.api._formatFilters(
+            [ConferenceQueryForm(field='CITY', operator='NE', value='Paris')])
+        result = self.api._listConferences(
+            self.api._getQuery(inequality, filters), self._page())
+        self.assertEqual(NUM_CONFERENCES, len(result.forms.items))
+        self.assertEqual({'datastore_v3': 3}, result.rpcs)
+
+    def testListConferencesByKeyCountsConferencesAndPools(self):
+        result = self.api._listConferencesByKey(
+            [conf.key for conf in self.confs])
+        self.assertEqual(NUM_CONFERENCES, len(result.forms.items))
+        self.assertEqual({'datastore_v3': 2}, result.rpcs)
+
+    def testListConferencesByKeyWithoutKeysMakesNoRpcs(self):
+        result = self.api._listConferencesByKey([])
+        self.assertEqual([], result.forms.items)
+        self.assertEqual({}, result.rpcs)
+
+    def testGetConferencesCreated(self):
+        forms, rpcs = self._datastoreRpcs(
+            self.api.getConferencesCreated, self._page())
+        self.assertEqual(NUM_CONFERENCES, len(forms.items))
+        self.assertEqual(2, rpcs)
+
+    def testGetConferencesByOrganizer(self):
+        # the organizer's Profile is looked up by name first
+        forms, rpcs = self._datastoreRpcs(
+            self.api.getConferencesByOrganizer,
+            CONF_BY_ORGANIZER_GET.combined_message_class(
+                organizer='Organizer'))
+        self.assertEqual(NUM_CONFERENCES, len(forms.items))
+        self.assertEqual(3, rpcs)
+
+    def testGetConferencesByOrganizerAppliesFieldMask(self):
+        forms = self.api.getConferencesByOrganizer(
+            CONF_BY_ORGANIZER_GET.combined_message_class(
+                organizer='Organizer', fields='name,websafeKey'))
+        self.assertEqual(NUM_CONFERENCES, len(forms.items))
+        for form in forms.items:
+            self.assertTrue(form.name)
+            self.assertTrue(form.websafeKey)
+            self.assertEqual(None, form.city)
+
+    def testQueryConferencesIsServedFromCacheWhenRepeated(self):
+        request = ConferenceQueryForms(filters=[ConferenceQueryForm(
+            field='CITY', operator='EQ', value='London')])
+        forms, rpcs = self._datastoreRpcs(self.api.queryConferences, request)
+        self.assertEqual(NUM_CONFERENCES, len(forms.items))
+        self.assertEqual(2, rpcs)
+
+        forms, rpcs = self._datastoreRpcs(self.api.queryConferences, request)
+        self.assertEqual(NUM_CONFERENCES, len(forms.items))
+        self.assertEqual(0, rpcs)
+
+    def testGetConferencesToAttend(self):
+        ndb.put_multi([Registration(id=conf.key.urlsafe(), parent=self.p_key)
+                       for conf in self.confs[:2]])
+        # Profile get and Registration query, then the conferences and
+        # their pools
+        forms, rpcs = self._datastoreRpcs(
+            self.api.getConferencesToAttend,
+            LIST_GET_REQUEST.combined_message_class())
+        self.assertEqual(2, len(forms.items))
+        self.assertEqual(4, rpcs)
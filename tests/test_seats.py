@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+"""test_seats.py
+
+Seat pools never hand out more seats than a conference has.
+
+"""
+
+from datetime import date
+
+from google.appengine.ext import ndb
+from protorpc import remote
+
+from conference import CONF_GET_REQUEST
+from conference import ConferenceApi
+from models import Conference
+from models import ConflictException
+from models import Profile
+from seats import buildSeatPools
+from seats import candidatePoolKeys
+from seats import getSeatsAvailable
+from seats import poolKeys
+from seats import returnSeat
+from seats import takeSeat
+from tests.base import AppEngineTestCase
+
+ORGANIZER = 'organizer@example.com'
+
+
+def storeConference(seats):
+    """Store a conference with seats split across its pools."""
+    p_key = ndb.Key(Profile, ORGANIZER)
+    conf = Conference(
+        key=ndb.Key(Conference, 1, parent=p_key),
+        name='Conference', organizerUserId=ORGANIZER, city='London',
+        startDate=date(2026, 6, 1), month=6, endDate=date(2026, 6, 2),
+        maxAttendees=seats, seatsAvailable=seats)
+    ndb.put_multi([conf] + buildSeatPools(conf, seats))
+    return conf
+
+
+@ndb.transactional
+def take(pool_key):
+    """Take a seat from a pool and store it; return the pool or None."""
+    pool = takeSeat(pool_key)
+    if pool:
+        pool.put()
+    return pool
+
+
+class SeatPoolTest(AppEngineTestCase):
+
+    def testTakeSeatTakesTheLastSeat(self):
+        conf = storeConference(1)
+        pool_key, = poolKeys(conf)
+        self.assertEqual(0, take(pool_key).seatsAvailable)
+        self.assertEqual(None, take(pool_key))
+        self.assertEqual(0, getSeatsAvailable(conf))
+
+    def testCandidatesSkipEmptyPools(self):
+        conf = storeConference(2)
+        empty, full = poolKeys(conf)
+        take(empty)
+        self.assertEqual([full], candidatePoolKeys(conf))
+
+    def testReturnSeatAddsASeat(self):
+        conf = storeConference(2)
+        for pool_key in poolKeys(conf):
+            take(pool_key)
+        ndb.transaction(lambda: returnSeat(conf).put(), xg=True)
+        self.assertEqual(1, getSeatsAvailable(conf))
+
+
+class RegistrationSeatTest(AppEngineTestCase):
+
+    def setUp(self):
+        super(RegistrationSeatTest, self).setUp()
+        self.api = ConferenceApi()
+        self.api.initialize_request_state(
+            remote.HttpRequestState(headers={}))
+        self.conf = storeConference(2)
+        self.request = CONF_GET_REQUEST.combined_message_class(
+            websafeConferenceKey=self.conf.key.urlsafe())
+
+    def _register(self, email):
+        self.login(email)
+        return self.api.registerForConference(self.request).data
+
+    def testRegistrationFallsBackToAnotherPool(self):
+        empty, full = poolKeys(self.conf)
+        take(empty)
+        self.assertTrue(self._register('attendee@example.com'))
+        self.assertEqual(0, full.get().seatsAvailable)
+
+    def testRegistrationFailsWhenEveryPoolIsEmpty(self):
+        self.assertTrue(self._register('first@example.com'))
+        self.assertTrue(self._register('second@example.com'))
+        self.assertRaises(ConflictException,
+                          self._register, 'third@example.com')
+        for pool in ndb.get_multi(poolKeys(self.conf)):
+            self.assertEqual(0, pool.seatsAvailable)
@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+
+"""test_sessionquery.py
+
+Validation of user supplied session filters.
+
+"""
+
+import unittest
+
+import endpoints
+
+from models import SessionQueryForm
+from sessionquery import parseFilters
+
+
+class ParseFiltersTest(unittest.TestCase):
+
+    def testStartTimeIsConvertedToSeconds(self):
+        parsed = parseFilters([SessionQueryForm(
+            field='START_TIME', operator='LT', value='19:30')])
+        self.assertEqual([{'field': 'startTime', 'operator': '<',
+                           'value': 19 * 3600 + 30 * 60}], parsed)
+
+    def testFilterWithoutValueIsRejected(self):
+        for field in ('START_TIME', 'DATE', 'TYPE'):
+            self.assertRaises(
+                endpoints.BadRequestException, parseFilters,
+                [SessionQueryForm(field=field, operator='EQ')])
+
+    def testMalformedStartTimeIsRejected(self):
+        self.assertRaises(
+            endpoints.BadRequestException, parseFilters,
+            [SessionQueryForm(field='START_TIME', operator='LT',
+                              value='half past seven')])
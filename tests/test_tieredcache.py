@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+
+"""test_tieredcache.py
+
+Rebuilds and write-throughs of the two-tier cache.
+
+"""
+
+from google.appengine.api import memcache
+
+import tieredcache
+from tests.base import AppEngineTestCase
+
+
+class TieredCacheTest(AppEngineTestCase):
+
+    def setUp(self):
+        super(TieredCacheTest, self).setUp()
+        self.cache = tieredcache.TieredCache('TEST_TIERED_', local_ttl=60)
+
+    def testMissIsBuiltAndCachedInBothTiers(self):
+        self.assertEqual('built', self.cache.get('k', lambda: 'built'))
+        self.assertEqual('built', memcache.get('TEST_TIERED_k'))
+        self.assertEqual('built', self.cache._getLocal('k'))
+
+    def testRebuildLosingToWriterKeepsWritersValue(self):
+        def build():
+            # another instance writes while this one rebuilds
+            memcache.set('TEST_TIERED_k', 'written')
+            return 'built'
+        self.assertEqual('written', self.cache.get('k', build))
+        self.assertEqual('written', self.cache._getLocal('k'))
+
+    def testOversizedValueIsKeptInInstanceMemoryOnly(self):
+        value = 'x' * (memcache.MAX_VALUE_SIZE + 1)
+        self.assertEqual(value, self.cache.get('k', lambda: value))
+        self.assertEqual(None, memcache.get('TEST_TIERED_k'))
+        self.assertEqual(value, self.cache._getLocal('k'))
+
+    def testClearLocalDropsInstanceEntries(self):
+        self.cache.get('k', lambda: 'built')
+        tieredcache.clearLocal()
+        self.assertEqual(None, self.cache._getLocal('k'))
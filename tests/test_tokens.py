@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+
+"""test_tokens.py
+
+Bearer token resolution in utils.getUserId, against a local HTTP stub of
+Google's tokeninfo and signing key endpoints.
+
+"""
+
+import BaseHTTPServer
+import base64
+import json
+import os
+import threading
+import urlparse
+
+from Crypto.Hash import SHA256
+from Crypto.PublicKey import RSA
+from Crypto.Signature import PKCS1_v1_5
+from Crypto.Util.number import long_to_bytes
+from google.appengine.api import users
+
+import idtokens
+import utils
+from settings import WEB_CLIENT_ID
+from tests.base import AppEngineTestCase
+
+NOW = 1700000000.0
+KEY_ID = 'test-key'
+
+
+def _b64(data):
+    """Encode data as unpadded base64url."""
+    return base64.urlsafe_b64encode(data).rstrip('=')
+
+
+def makeIdToken(key, claims, kid=KEY_ID):
+    """Return an RS256 JWT with claims, signed with key."""
+    header = _b64(json.dumps({'alg': 'RS256', 'kid': kid}))
+    body = _b64(json.dumps(claims))
+    signature = PKCS1_v1_5.new(key).sign(
+        SHA256.new('%s.%s' % (header, body)))
+    return '%s.%s.%s' % (header, body, _b64(signature))
+
+
+def idTokenClaims(**claims):
+    """Return valid ID token claims for this app, updated with claims."""
+    return dict({'iss': 'accounts.google.com', 'aud': WEB_CLIENT_ID,
+                 'sub': 'id-user', 'iat': NOW - 60, 'exp': NOW + 600},
+                **claims)
+
+
+class _StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Serves /tokeninfo from StubServer.tokens and /certs from
+    StubServer.keys, recording every request."""
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        self.server.requests.append(url.path)
+        if url.path == '/certs':
+            self._reply(200, {'keys': self.server.keys})
+            return
+        params = urlparse.parse_qs(url.query)
+        token = (params.get('id_token') or params.get('access_token'))[0]
+        if token in self.server.tokens:
+            self._reply(200, self.server.tokens[token])
+        else:
+            self._reply(400, {'error': 'invalid_token'})
+
+    def _reply(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(body))
+
+    def log_message(self, *args):
+        pass
+
+
+class _FakeClock(object):
+    """Stands in for the time module in utils."""
+
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+class TokenUserIdTest(AppEngineTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), _StubHandler)
+        cls.server.requests = []
+        cls.server.tokens = {}
+        cls.server.keys = []
+        thread = threading.Thread(target=cls.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        cls.url = 'http://127.0.0.1:%d' % cls.server.server_port
+        cls.key = RSA.generate(1024)
+        cls.other_key = RSA.generate(1024)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        super(TokenUserIdTest, self).setUp()
+        self.server.requests[:] = []
+        self.server.tokens.clear()
+        self.server.tokens['access-1'] = {'user_id': 'user-1',
+                                          'expires_in': 600}
+        self.server.keys[:] = [{
+            'kty': 'RSA', 'alg': 'RS256', 'kid': KEY_ID,
+            'n': _b64(long_to_bytes(self.key.n)),
+            'e': _b64(long_to_bytes(self.key.e))}]
+        self.saved = (utils.TOKENINFO_URL, idtokens.CERTS_URL, utils.time,
+                      utils.VERIFY_ID_TOKENS_LOCALLY)
+        utils.TOKENINFO_URL = self.url + '/tokeninfo'
+        idtokens.CERTS_URL = self.url + '/certs'
+        utils.time = self.clock = _FakeClock(NOW)
+        utils._token_cache.clear()
+        idtokens._last_fetch[0] = 0
+
+    def tearDown(self):
+        (utils.TOKENINFO_URL, idtokens.CERTS_URL, utils.time,
+         utils.VERIFY_ID_TOKENS_LOCALLY) = self.saved
+        utils._token_cache.clear()
+        os.environ.pop('HTTP_AUTHORIZATION', None)
+        super(TokenUserIdTest, self).tearDown()
+
+    def _tokeninfoRequests(self):
+        return self.server.requests.count('/tokeninfo')
+
+    def testMissResolvesTokenWithTokeninfo(self):
+        self.assertEqual('user-1', utils._tokenUserId('access-1'))
+        self.assertEqual(1, self._tokeninfoRequests())
+
+    def testHitIsServedFromInstanceCache(self):
+        utils._tokenUserId('access-1')
+        self.assertEqual('user-1', utils._tokenUserId('access-1'))
+        self.assertEqual(1, self._tokeninfoRequests())
+
+    def testHitIsServedFromMemcacheOnAnotherInstance(self):
+        utils._tokenUserId('access-1')
+        # a fresh instance starts with an empty in-process cache
+        utils._token_cache.clear()
+        self.assertEqual('user-1', utils._tokenUserId('access-1'))
+        self.assertEqual(1, self._tokeninfoRequests())
+
+    def testExpiredTokenIsResolvedAgain(self):
+        utils._tokenUserId('access-1')
+        self.clock.now += 601
+        self.assertEqual('user-1', utils._tokenUserId('access-1'))
+        self.assertEqual(2, self._tokeninfoRequests())
+
+    def testCacheIsCappedAtTokenLifetime(self):
+        self.server.tokens['access-1']['expires_in'] = 10 * utils.MAX_TOKEN_TTL
+        utils._tokenUserId('access-1')
+        self.clock.now += utils.MAX_TOKEN_TTL + 1
+        utils._tokenUserId('access-1')
+        self.assertEqual(2, self._tokeninfoRequests())
+
+    def testRejectedTokenIsNotCached(self):
+        self.assertEqual('', utils._tokenUserId('unknown'))
+        requests = self._tokeninfoRequests()
+        self.assertEqual('', utils._tokenUserId('unknown'))
+        self.assertEqual(2 * requests, self._tokeninfoRequests())
+
+    def testGetUserIdResolvesBearerToken(self):
+        os.environ['HTTP_AUTHORIZATION'] = 'Bearer access-1'
+        user = users.User('someone@example.com')
+        self.assertEqual('user-1', utils.getUserId(user, id_type='oauth'))
+
+    def testIdTokenIsVerifiedLocally(self):
+        utils.VERIFY_ID_TOKENS_LOCALLY = True
+        token = makeIdToken(self.key, idTokenClaims())
+        self.assertEqual('id-user', utils._tokenUserId(token))
+        self.assertEqual(0, self._tokeninfoRequests())
+        # the signing keys are cached along with the token
+        self.assertEqual('id-user', utils._tokenUserId(token))
+        self.assertEqual(1, self.server.requests.count('/certs'))
+
+    def testIdTokenWithBadSignatureFallsBackToTokeninfo(self):
+        utils.VERIFY_ID_TOKENS_LOCALLY = True
+        token = makeIdToken(self.other_key, idTokenClaims())
+        self.assertEqual((None, 0), utils._verifyIdToken(token, NOW))
+        # tokeninfo doesn't know the forged token either
+        self.assertEqual('', utils._tokenUserId(token))
+        self.assertTrue(self._tokeninfoRequests() > 0)
+
+    def testIdTokenWithUnknownKeyIsRejected(self):
+        token = makeIdToken(self.key, idTokenClaims(), kid='rotated-away')
+        self.assertEqual((None, 0), utils._verifyIdToken(token, NOW))
+
+    def testUnknownKeysRefetchTheSigningKeysAtMostOncePerInterval(self):
+        for kid in ('made-up-1', 'made-up-2', 'made-up-3'):
+            token = makeIdToken(self.key, idTokenClaims(), kid=kid)
+            self.assertEqual((None, 0), utils._verifyIdToken(token, NOW))
+        # the first token fetches the keys; the others find them cached and
+        # may not fetch them again yet
+        self.assertEqual(1, self.server.requests.count('/certs'))
+
+    def testIdTokenForAnotherAudienceIsRejected(self):
+        token = makeIdToken(self.key, idTokenClaims(aud='someone-else'))
+        self.assertEqual((None, 0), utils._verifyIdToken(token, NOW))
+
+    def testExpiredIdTokenIsRejected(self):
+        token = makeIdToken(self.key, idTokenClaims(exp=NOW - 3600))
+        self.assertEqual((None, 0), utils._verifyIdToken(token, NOW))
+
+    def testMalformedIdTokenIsRejected(self):
+        self.assertEqual((None, 0), utils._verifyIdToken('not-a-jwt', NOW))
+        self.assertEqual((None, 0), utils._verifyIdToken('a.b.c', NOW))
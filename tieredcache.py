@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+
+"""tieredcache.py
+
+Two-tier cache for small, hot values that change rarely.
+
+Reads are served from a size-bounded LRU in instance memory, then from
+memcache, then by recomputing the value. Instance entries live for a short,
+jittered TTL, so the instances of an app don't all go back to memcache at
+the same moment, and a value written on one instance reaches the others
+within that TTL.
+
+Strings longer than memcache's value size limit are kept in instance
+memory only. Values of other types are assumed to fit.
+
+Hits and misses are counted per tier in instance memory and added to
+memcache counters in batches, where getStats() reads the totals of all
+instances.
+
+"""
+
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from google.appengine.api import memcache
+
+MEMCACHE_STATS_PREFIX = "TIERED_CACHE_STATS_"
+STATS_FLUSH_INTERVAL = 60
+TTL_JITTER = 0.2
+TIERS = ('local', 'memcache', 'miss')
+CAS_ATTEMPTS = 3
+
+_lock = threading.Lock()
+# cache name -> TieredCache, for getStats()
+_caches = OrderedDict()
+_last_flush = [time.time()]
+
+
+def _fitsMemcache(value):
+    """Return False for strings too long to be stored in memcache."""
+    return not isinstance(value, basestring) or \
+        len(value) <= memcache.MAX_VALUE_SIZE
+
+
+class TieredCache(object):
+    """Instance memory and memcache cache of values named by a prefix."""
+
+    def __init__(self, prefix, local_ttl, memcache_ttl=0, max_entries=100):
+        """Create the cache of memcache keys starting with prefix.
+
+        Args:
+            prefix: memcache key prefix; also names the cache in getStats()
+            local_ttl: seconds an entry is kept in instance memory, less up
+                to TTL_JITTER of it
+            memcache_ttl: seconds an entry is kept in memcache; 0 keeps it
+                until evicted
+            max_entries: entries kept in instance memory
+        """
+        self.prefix = prefix
+        self.local_ttl = local_ttl
+        self.memcache_ttl = memcache_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._counts = dict((tier, 0) for tier in TIERS)
+        with _lock:
+            _caches[prefix] = self
+
+    def _getLocal(self, key):
+        """Return the unexpired value of key in instance memory, or None."""
+        with _lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.time():
+                return None
+            # re-inserting keeps the most recently used entries last
+            self._entries[key] = entry
+            return value
+
+    def _putLocal(self, key, value):
+        """Keep value for key in instance memory for a jittered TTL."""
+        ttl = self.local_ttl * random.uniform(1 - TTL_JITTER, 1)
+        with _lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time() + ttl, value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _count(self, tier):
+        """Count a read served by tier."""
+        with _lock:
+            self._counts[tier] += 1
+        if time.time() - _last_flush[0] > STATS_FLUSH_INTERVAL:
+            flushStats()
+
+    def get(self, key, build):
+        """Return the value of key, building and caching it on a miss.
+
+        Args:
+            key: string appended to the prefix to form the memcache key
+            build: callable returning the freshly built value, which must
+                not be None
+        """
+        value = self._getLocal(key)
+        if value is not None:
+            self._count('local')
+            return value
+
+        value = memcache.get(self.prefix + key)
+        if value is not None:
+            self._count('memcache')
+        else:
+            self._count('miss')
+            value = build()
+            if _fitsMemcache(value) and not memcache.add(
+                    self.prefix + key, value, time=self.memcache_ttl):
+                # a value a writer set meanwhile wins over the rebuilt one
+                cached = memcache.get(self.prefix + key)
+                if cached is not None:
+                    value = cached
+        self._putLocal(key, value)
+        return value
+
+    def peek(self, key):
+        """Return the value of key in memcache, or None; nothing is built
+        or counted."""
+        return memcache.get(self.prefix + key)
+
+    def set(self, key, value):
+        """Write value through to instance memory and memcache."""
+        if _fitsMemcache(value):
+            memcache.set(self.prefix + key, value, time=self.memcache_ttl)
+        else:
+            memcache.delete(self.prefix + key)
+        self._putLocal(key, value)
+
+    def setIf(self, key, value, replaces):
+        """Write value through unless memcache holds a value to keep.
+
+        Uses compare-and-set, so of two concurrent writers the value that
+        replaces the other is the one left in memcache.
+
+        Args:
+            key: string appended to the prefix to form the memcache key
+            value: the new value
+            replaces: callable taking the value cached in memcache and
+                returning True if value may replace it
+        Returns:
+            value: the value now cached, which is the cached one if it was
+            kept
+        """
+        client = memcache.Client()
+        name = self.prefix + key
+        for _ in range(CAS_ATTEMPTS):
+            cached = client.gets(name)
+            if cached is None:
+                if client.add(name, value, time=self.memcache_ttl):
+                    break
+            elif not replaces(cached):
+                value = cached
+                break
+            elif client.cas(name, value, time=self.memcache_ttl):
+                break
+        self._putLocal(key, value)
+        return value
+
+    def delete(self, key):
+        """Drop key from instance memory and memcache. Other instances keep
+        serving their copy until its TTL runs out."""
+        memcache.delete(self.prefix + key)
+        with _lock:
+            self._entries.pop(key, None)
+
+
+def clearLocal():
+    """Drop every cache's entries from instance memory, as on a fresh
+    instance."""
+    with _lock:
+        for cache in _caches.values():
+            cache._entries.clear()
+
+
+def flushStats():
+    """Add this instance's hit and miss counts to the memcache totals."""
+    _last_flush[0] = time.time()
+    deltas = {}
+    with _lock:
+        for prefix, cache in _caches.items():
+            for tier in TIERS:
+                if cache._counts[tier]:
+                    deltas['%s_%s' % (prefix, tier)] = cache._counts[tier]
+                    cache._counts[tier] = 0
+    if deltas:
+        memcache.offset_multi(deltas, key_prefix=MEMCACHE_STATS_PREFIX,
+                              initial_value=0)
+
+
+def getStats():
+    """Return the hit and miss counts of every cache, across instances.
+
+    Returns:
+        list of (prefix, counts) tuples; counts maps each of TIERS to the
+        number of reads served by it
+    """
+    flushStats()
+    with _lock:
+        prefixes = list(_caches)
+    totals = memcache.get_multi(
+        ['%s_%s' % (prefix, tier) for prefix in prefixes for tier in TIERS],
+        key_prefix=MEMCACHE_STATS_PREFIX)
+    return [(prefix, dict((tier, totals.get('%s_%s' % (prefix, tier), 0))
+                          for tier in TIERS))
+            for prefix in prefixes]
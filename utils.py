@@ -1,11 +1,31 @@
+import hashlib
 import json
 import os
+import threading
 import time
 import uuid
+from collections import OrderedDict
 
+from google.appengine.api import memcache
 from google.appengine.api import urlfetch
+from google.appengine.ext import ndb
 from models import Profile
 
+from settings import ANDROID_AUDIENCE
+from settings import VERIFY_ID_TOKENS_LOCALLY
+from settings import WEB_CLIENT_ID
+
+# tokeninfo endpoint; point TOKENINFO_URL at a local stub in tests
+TOKENINFO_URL = os.environ.get(
+    'TOKENINFO_URL', 'https://www.googleapis.com/oauth2/v1/tokeninfo')
+TOKENINFO_ATTEMPTS = 3
+TOKENINFO_DEADLINE = 5
+ID_TOKEN_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+ID_TOKEN_AUDIENCES = (WEB_CLIENT_ID, ANDROID_AUDIENCE)
+MEMCACHE_TOKEN_KEY = "TOKEN_USER_ID_"
+MAX_TOKEN_TTL = 3600
+TOKEN_CACHE_SIZE = 1000
+
 def getSeconds(time_str):
     """Converts a time string to an integer.
 
@@ -36,6 +56,121 @@ def getTimeString(seconds):
     time_str = "%02d:%02d" % (hours, minutes)
     return time_str
 
+def parseKey(websafe_key, model_class):
+    """Decode a websafe key sent by a client.
+
+    Args:
+        websafe_key: websafe key string
+        model_class: ndb.Model subclass the key must belong to
+    Returns:
+        key: the ndb.Key, or None if websafe_key is malformed or the key
+        is of another kind
+    """
+    if not websafe_key:
+        return None
+    try:
+        key = ndb.Key(urlsafe=websafe_key)
+    except Exception:
+        # bad base64 and undecodable protocol buffers raise unrelated types
+        return None
+    if key.kind() != model_class._get_kind():
+        return None
+    return key
+
+# token cache key -> (user_id, expiry time); most recently used last
+_token_cache = OrderedDict()
+_token_cache_lock = threading.Lock()
+
+
+def _getCachedToken(cache_key, now):
+    """Return the user id cached in this instance for a token, or None."""
+    with _token_cache_lock:
+        entry = _token_cache.pop(cache_key, None)
+        if entry is None or entry[1] <= now:
+            return None
+        _token_cache[cache_key] = entry
+        return entry[0]
+
+
+def _cacheToken(cache_key, user_id, expires):
+    """Remember a token's user id in this instance until expires."""
+    with _token_cache_lock:
+        _token_cache.pop(cache_key, None)
+        _token_cache[cache_key] = (user_id, expires)
+        while len(_token_cache) > TOKEN_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+
+
+def _fetchTokenInfo(token):
+    """Resolve a token with Google's tokeninfo endpoint.
+
+    Returns:
+        (user_id, expires_in): expires_in is the token's remaining
+        lifetime in seconds; user_id is '' if the token was not accepted
+    """
+    token_type = 'id_token'
+    if 'OAUTH_USER_ID' in os.environ:
+        token_type = 'access_token'
+    for _ in range(TOKENINFO_ATTEMPTS):
+        resp = urlfetch.fetch('%s?%s=%s' % (TOKENINFO_URL, token_type, token),
+                              deadline=TOKENINFO_DEADLINE)
+        if resp.status_code == 200:
+            info = json.loads(resp.content)
+            return info.get('user_id', ''), int(info.get('expires_in', 0))
+        elif resp.status_code == 400 and 'invalid_token' in resp.content:
+            token_type = 'access_token'
+        # other failures are retried right away; sleeping between attempts
+        # would hold up the request
+    return '', 0
+
+
+def _verifyIdToken(token, now):
+    """Verify a Google ID token against the cached Google signing keys
+    (see idtokens.py).
+
+    Returns:
+        (user_id, expires_in), or (None, 0) if the token is not a valid
+        ID token for this app
+    """
+    # pycrypto is only needed when ID tokens are verified locally
+    import idtokens
+    try:
+        claims = idtokens.verifyIdToken(token, now, ID_TOKEN_ISSUERS,
+                                        ID_TOKEN_AUDIENCES)
+    except idtokens.InvalidTokenError:
+        return None, 0
+    return claims['sub'], int(float(claims['exp']) - now)
+
+
+def _tokenUserId(token):
+    """Return the user id of a bearer token.
+
+    Results are cached in instance memory in front of memcache until the
+    token expires, so a token is resolved once, not on every request.
+    """
+    now = time.time()
+    cache_key = MEMCACHE_TOKEN_KEY + hashlib.sha256(token).hexdigest()
+    user_id = _getCachedToken(cache_key, now)
+    if user_id is not None:
+        return user_id
+    cached = memcache.get(cache_key)
+    if cached is not None and cached[1] > now:
+        _cacheToken(cache_key, *cached)
+        return cached[0]
+
+    user_id = None
+    if VERIFY_ID_TOKENS_LOCALLY and 'OAUTH_USER_ID' not in os.environ:
+        user_id, expires_in = _verifyIdToken(token, now)
+    if user_id is None:
+        user_id, expires_in = _fetchTokenInfo(token)
+
+    ttl = min(expires_in, MAX_TOKEN_TTL)
+    if user_id and ttl > 0:
+        _cacheToken(cache_key, user_id, now + ttl)
+        memcache.set(cache_key, (user_id, now + ttl), time=int(ttl))
+    return user_id
+
+
 def getUserId(user, id_type="email"):
     if id_type == "email":
         return user.email()
@@ -44,25 +179,7 @@ def getUserId(user, id_type="email"):
         """A workaround implementation for getting userid."""
         auth = os.getenv('HTTP_AUTHORIZATION')
         bearer, token = auth.split()
-        token_type = 'id_token'
-        if 'OAUTH_USER_ID' in os.environ:
-            token_type = 'access_token'
-        url = ('https://www.googleapis.com/oauth2/v1/tokeninfo?%s=%s'
-               % (token_type, token))
-        user = {}
-        wait = 1
-        for i in range(3):
-            resp = urlfetch.fetch(url)
-            if resp.status_code == 200:
-                user = json.loads(resp.content)
-                break
-            elif resp.status_code == 400 and 'invalid_token' in resp.content:
-                url = ('https://www.googleapis.com/oauth2/v1/tokeninfo?%s=%s'
-                       % ('access_token', token))
-            else:
-                time.sleep(wait)
-                wait = wait + i
-        return user.get('user_id', '')
+        return _tokenUserId(token)
 
     if id_type == "custom":
         # implement your own user_id creation and getting algorythm